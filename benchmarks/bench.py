@@ -0,0 +1,296 @@
+"""
+Benchmark loading, DotMap conversion and variable access.
+
+Synthetic configs are generated for every supported format in a few sizes and
+shapes, then each step is timed separately. Results are written as JSON so two
+commits can be compared:
+
+    python -m benchmarks.bench --output before.json
+    git checkout other-branch
+    python -m benchmarks.bench --output after.json --compare before.json
+
+With `--compare`, the run fails when a timing regressed by more than
+`--threshold` (a fraction, 0.2 by default).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from functools import reduce
+
+from konfik import DotMap, Konfik, _get_version, _parse
+
+FORMATS = ["json", "yaml", "toml", "env"]
+SHAPES = ["wide", "deep", "list"]
+SIZES = {"1KB": 1 << 10, "100KB": 100 << 10, "1MB": 1 << 20, "10MB": 10 << 20}
+SIZES_ALL = dict(SIZES, **{"100MB": 100 << 20})
+
+# Nesting depth of the `deep` shape.
+DEPTH = 16
+
+# Timings shorter than this are too noisy to call a regression.
+NOISE_FLOOR = 0.001
+
+
+def make_unit(shape, i):
+    """Return one repeating unit of a config of the given shape and its key."""
+
+    if shape == "wide":
+        return f"key_{i}", {
+            "name": f"service-{i}",
+            "port": 8000 + i,
+            "enabled": i % 2 == 0,
+            "tags": ["alpha", "beta", "gamma"],
+        }
+
+    if shape == "deep":
+        node = {"value": i, "name": f"leaf-{i}"}
+        for level in reversed(range(DEPTH)):
+            node = {f"level_{level}": node}
+        return f"branch_{i}", node
+
+    return None, {"id": i, "name": f"item-{i}", "values": [i, i + 1, i + 2]}
+
+
+def make_config(shape, size):
+    """Build a config of roughly `size` bytes once serialized."""
+
+    _, unit = make_unit(shape, 0)
+    unit_size = len(json.dumps(unit)) + 16
+    count = max(1, size // unit_size)
+
+    if shape == "list":
+        return {"entries": [make_unit(shape, i)[1] for i in range(count)]}, count
+    return dict(make_unit(shape, i) for i in range(count)), count
+
+
+def flatten_env(config):
+    """Flatten a config into `KEY=value` pairs for the dotenv format."""
+
+    flat = {}
+
+    def walk(obj, prefix):
+        if isinstance(obj, dict):
+            for key, val in obj.items():
+                walk(val, f"{prefix}{key}__")
+        elif isinstance(obj, list):
+            for i, val in enumerate(obj):
+                walk(val, f"{prefix}{i}__")
+        else:
+            flat[prefix[:-2].upper()] = obj
+
+    walk(config, "")
+    return flat
+
+
+def write_config(directory, fmt, shape, size_name, config):
+    path = os.path.join(directory, f"{shape}-{size_name}.{fmt}")
+
+    if fmt == "json":
+        with open(path, "w") as f:
+            json.dump(config, f)
+
+    elif fmt == "yaml":
+        import yaml
+
+        dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+        with open(path, "w") as f:
+            yaml.dump(config, f, Dumper=dumper)
+
+    elif fmt == "toml":
+        import toml
+
+        with open(path, "w") as f:
+            toml.dump(config, f)
+
+    elif fmt == "env":
+        with open(path, "w") as f:
+            for key, val in flatten_env(config).items():
+                f.write(f"{key}={val}\n")
+
+    return path
+
+
+def access_path(fmt, shape, count):
+    """Return the path of a variable near the end of the config."""
+
+    last = count - 1
+    if fmt == "env":
+        if shape == "wide":
+            return [f"KEY_{last}__NAME"]
+        if shape == "deep":
+            levels = "__".join(f"LEVEL_{level}" for level in range(DEPTH))
+            return [f"BRANCH_{last}__{levels}__VALUE"]
+        return [f"ENTRIES__{last}__NAME"]
+
+    if shape == "wide":
+        return [f"key_{last}", "name"]
+    if shape == "deep":
+        return [f"branch_{last}"] + [f"level_{i}" for i in range(DEPTH)] + ["value"]
+    return ["entries", last, "name"]
+
+
+def best_of(repeat, func):
+    """Return the fastest of `repeat` runs of `func` and its last result."""
+
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench_one(path, keys, repeat, accesses, run_cli):
+    """Time every step for a single config file."""
+
+    timings = {}
+
+    timings["parse"], (_, config_raw) = best_of(repeat, lambda: _parse(path))
+    timings["convert"], config = best_of(repeat, lambda: DotMap(config_raw))
+    timings["load"], konfik = best_of(repeat, lambda: Konfik(path))
+
+    def attribute_access():
+        for _ in range(accesses):
+            reduce(
+                lambda o, k: o[k] if isinstance(k, int) else getattr(o, k), keys, config
+            )
+
+    def get_by_path():
+        for _ in range(accesses):
+            Konfik.get_by_path(config_raw, keys)
+
+    query = ".".join(str(k) for k in keys)
+
+    def get():
+        for _ in range(accesses):
+            konfik.get(query)
+
+    timings["attribute_access"], _ = best_of(repeat, attribute_access)
+    timings["get_by_path"], _ = best_of(repeat, get_by_path)
+    timings["get"], _ = best_of(repeat, get)
+
+    if run_cli:
+        command = [
+            sys.executable,
+            "-c",
+            "from konfik import cli_entrypoint; cli_entrypoint()",
+            f"--path={path}",
+            f"--var={query}",
+        ]
+        timings["cli_var"], _ = best_of(
+            repeat,
+            lambda: subprocess.run(command, stdout=subprocess.DEVNULL, check=True),
+        )
+
+    return timings
+
+
+def run(formats, shapes, sizes, repeat, accesses, run_cli, log=print):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for shape in shapes:
+            for size_name, size in sizes.items():
+                config, count = make_config(shape, size)
+                for fmt in formats:
+                    path = write_config(directory, fmt, shape, size_name, config)
+                    keys = access_path(fmt, shape, count)
+                    timings = bench_one(path, keys, repeat, accesses, run_cli)
+                    for step, seconds in timings.items():
+                        name = f"{fmt}/{shape}/{size_name}/{step}"
+                        results[name] = seconds
+                        log(f"{name:<40} {seconds * 1000:>12.3f} ms")
+    return results
+
+
+def compare(results, baseline, threshold, log=print):
+    """Return the names of the timings that regressed against `baseline`."""
+
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+
+        change = (seconds - before) / before if before else 0.0
+        regressed = change > threshold and seconds - before > NOISE_FLOOR
+        if regressed:
+            regressions.append(name)
+        marker = "REGRESSED" if regressed else ""
+        log(
+            f"{name:<40} {before * 1000:>10.3f} -> {seconds * 1000:>10.3f} ms "
+            f"{change:>+8.1%} {marker}"
+        )
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark konfik.")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument(
+        "--sizes",
+        default=",".join(SIZES),
+        help=f"comma separated, out of {', '.join(SIZES_ALL)}",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing")
+    parser.add_argument(
+        "--accesses", type=int, default=1000, help="lookups per access timing"
+    )
+    parser.add_argument("--no-cli", action="store_true", help="skip the CLI timings")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail when a timing is slower than the baseline by this fraction",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    results = run(
+        formats=args.formats.split(","),
+        shapes=args.shapes.split(","),
+        sizes={name: SIZES_ALL[name] for name in args.sizes.split(",")},
+        repeat=args.repeat,
+        accesses=args.accesses,
+        run_cli=not args.no_cli,
+    )
+
+    report = {
+        "meta": {
+            "konfik": _get_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} timings regressed by more than "
+                f"{args.threshold:.0%}."
+            )
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
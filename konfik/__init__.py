@@ -1,70 +1,347 @@
-import argparse
-import json
 import operator
+import os
 import sys
-import traceback
-from functools import reduce
-from pprint import pformat
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from collections.abc import ItemsView, Mapping, Sequence, ValuesView
+from functools import lru_cache, reduce
 
-import pkg_resources
-import toml
-import yaml
-from dotenv import dotenv_values, find_dotenv
-from pygments import highlight
-from pygments.formatters import TerminalFormatter
-from pygments.lexers import PythonLexer, get_lexer_by_name
+# Only cheap stdlib modules are imported here. Pygments, the format backends and
+# argparse are imported where they're used so that `import konfik` stays fast.
 
-__all__ = ["Konfik"]
+__all__ = ["Konfik", "ParseCache", "register_loader", "register_stats_hook"]
 
-__version__ = pkg_resources.get_distribution("konfik").version
+
+def _get_version():
+    """Read the installed version from the package metadata."""
+
+    try:
+        from importlib.metadata import version
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+
+        return pkg_resources.get_distribution("konfik").version
+    return version("konfik")
+
+
+if sys.version_info >= (3, 7):
+
+    def __getattr__(name):
+        # Reading the package metadata is slow, so `__version__` is resolved on
+        # first access (PEP 562) and cached in the module namespace.
+        if name == "__version__":
+            globals()["__version__"] = version = _get_version()
+            return version
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+else:
+    __version__ = _get_version()
 
 
 class Colorize:
-    """Colorize tracebacks, variables and config literals."""
+    """Colorize tracebacks, variables and config literals.
+
+    Output is highlighted only when it goes to a terminal and the `NO_COLOR`
+    environment variable isn't set. Otherwise it's written as it is, without
+    importing pygments. Pass `color=True` or `color=False` to decide yourself.
+    """
+
+    # Config files are highlighted in pieces of about this many bytes.
+    chunk_size = 256 * 1024
+
+    def __init__(self, color=None):
+        self.color = color
+        self._formatter = None
+
+    @property
+    def formatter(self):
+        if self._formatter is None:
+            from pygments.formatters import TerminalFormatter
+
+            self._formatter = TerminalFormatter()
+        return self._formatter
+
+    def use_color(self, stream):
+        """Tell if output written to `stream` should be highlighted."""
+
+        if self.color is not None:
+            return self.color
+        if os.environ.get("NO_COLOR"):
+            return False
+        isatty = getattr(stream, "isatty", None)
+        return bool(isatty and isatty())
+
+    def install_excepthook(self):
+        """Colorize uncaught exception tracebacks."""
 
-    def __init__(self):
-        self.formatter = TerminalFormatter()
         sys.excepthook = self.colorize_traceback
 
     def colorize_traceback(self, type, value, tb):
         """Colorize exception tracebacks."""
 
-        lexer = get_lexer_by_name("py3tb")
+        import traceback
+
         tbtext = "".join(traceback.format_exception(type, value, tb))
 
         # Error needs to go to stderr
+        if not self.use_color(sys.stderr):
+            sys.stderr.write(tbtext)
+            return
+
+        from pygments import highlight
+        from pygments.lexers import get_lexer_by_name
+
+        lexer = get_lexer_by_name("py3tb")
         sys.stderr.write(highlight(tbtext, lexer, self.formatter))
 
-    def colorize_config(self, config_str, config_ext):
-        """Colorize config literals."""
+    def _config_lexer(self, config_ext):
+        from pygments.lexers import get_lexer_by_name
 
         lexer_map = {
             "toml": "toml",
             "json": "json",
             "env": "bash",
             "yaml": "yaml",
+            "yml": "yaml",
         }
+        return get_lexer_by_name(lexer_map.get(config_ext, "text"))
+
+    def colorize_config(self, config_str, config_ext):
+        """Colorize config literals."""
+
+        if not self.use_color(sys.stdout):
+            print(config_str)
+            return
+
+        from pygments import highlight
 
-        lexer = get_lexer_by_name(lexer_map.get(config_ext))
+        lexer = self._config_lexer(config_ext)
         print(highlight(config_str, lexer, self.formatter))
 
-    def colorize_entity(self, entity):
-        """Colorize printed Python objects."""
+    def colorize_file(self, config_path, config_ext):
+        """
+        Print a config file. Without colors its bytes are copied straight to
+        stdout, otherwise it's highlighted and written a chunk at a time, each
+        ending on a line boundary.
+        """
+
+        sys.stdout.flush()
+        if not self.use_color(sys.stdout):
+            import shutil
+
+            out = getattr(sys.stdout, "buffer", None)
+            if out is not None:
+                with open(config_path, "rb") as f:
+                    shutil.copyfileobj(f, out, self.chunk_size)
+                out.flush()
+            else:
+                # A text-only stdout, decode as a stream so that characters
+                # split between chunks come out whole.
+                with open(config_path, encoding="utf-8") as f:
+                    shutil.copyfileobj(f, sys.stdout, self.chunk_size)
+            return
+
+        from pygments import highlight
+
+        lexer = self._config_lexer(config_ext)
+        with open(config_path) as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                # Finish the line so that no token is split between chunks.
+                chunk += f.readline()
+                highlight(chunk, lexer, self.formatter, outfile=sys.stdout)
+        sys.stdout.flush()
+
+    # Lines of Python objects are highlighted and written this many at a time.
+    batch_size = 100
+
+    def colorize_entity(self, entity, max_depth=None, max_items=None):
+        """
+        Colorize printed Python objects. The output is written as it's
+        produced, collapsed below `max_depth` and cut after `max_items` items
+        of each container.
+        """
+
+        from konfik.pretty import pretty_lines
+
+        self.colorize_lines(pretty_lines(entity, max_depth, max_items))
+
+    def colorize_lines(self, lines):
+        """Colorize lines of Python objects in batches as they come."""
+
+        from itertools import islice
+
+        color = self.use_color(sys.stdout)
+        if color:
+            from pygments import highlight
+            from pygments.lexers import PythonLexer
+
+            lexer = PythonLexer()
+
+        lines = iter(lines)
+        while True:
+            batch = list(islice(lines, self.batch_size))
+            if not batch:
+                break
+            text = "\n".join(batch) + "\n"
+            if color:
+                highlight(text, lexer, self.formatter, outfile=sys.stdout)
+            else:
+                sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def colorize_formatted(self, text):
+        """Colorize a Python object that's already been formatted."""
+
+        if not self.use_color(sys.stdout):
+            print(text)
+            return
+
+        from pygments import highlight
+        from pygments.lexers import PythonLexer
 
         lexer = PythonLexer()
-        entity = pformat(entity, indent=1, compact=True, width=60)
-        print(highlight(entity, lexer, self.formatter))
+        print(highlight(text, lexer, self.formatter))
 
     def colorize_title(self, text):
         """Colorize CLI title."""
 
+        if not self.use_color(sys.stdout):
+            print(text)
+            return
+
         CYAN = "\033[96m"
         BOLD = "\033[1m"
         ENDC = "\033[0m"
         print(CYAN + BOLD + text + ENDC)
 
 
-colorize = Colorize()
+@lru_cache(maxsize=None)
+def _colorize():
+    """Shared `Colorize` instance, created on first use."""
+
+    return Colorize()
+
+
+def _yaml_loader():
+    """
+    Pick libyaml's `CSafeLoader` when PyYAML was built against it and fall back
+    to the pure-Python `SafeLoader` otherwise. Set the `KONFIK_YAML_LOADER`
+    environment variable to `c` or `pure` to force one of them.
+    """
+
+    import yaml
+
+    choice = os.environ.get("KONFIK_YAML_LOADER", "auto").lower()
+    if choice == "pure":
+        return yaml.SafeLoader
+    elif choice == "c":
+        if not yaml.__with_libyaml__:
+            raise ImportError("PyYAML was built without libyaml support.")
+        return yaml.CSafeLoader
+    elif choice == "auto":
+        return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    else:
+        raise ValueError(
+            f"KONFIK_YAML_LOADER must be 'auto', 'c' or 'pure', not '{choice}'."
+        )
+
+
+@lru_cache(maxsize=None)
+def _json_parser():
+    """Pick `orjson` when it's installed and fall back to the stdlib `json`."""
+
+    import json
+
+    try:
+        import orjson
+    except ImportError:
+        return "json", json.loads
+
+    def loads(s):
+        # orjson is stricter than the stdlib parser, e.g. it rejects NaN and
+        # integers wider than 64 bits. Let `json` decide on those documents.
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return json.loads(s)
+
+    return "orjson", loads
+
+
+@lru_cache(maxsize=None)
+def _toml_parser():
+    """Pick the fastest installed TOML parser: `tomllib`, `tomli` then `toml`."""
+
+    for name in ("tomllib", "tomli", "toml"):
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        return name, module.loads
+
+    raise ImportError("No TOML parser is installed.")
+
+
+# Sentinel for arguments that weren't passed.
+_MISSING = object()
+
+
+class _IOStats(threading.local):
+    """Time spent reading config files and bytes read by the current thread."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = 0.0
+        self.bytes = 0
+
+
+_io_stats = _IOStats()
+
+
+def _read_file(config_path):
+    """Read a config file as bytes and account for it in `_io_stats`."""
+
+    started = time.perf_counter()
+    with open(config_path, "rb") as f:
+        data = f.read()
+    _io_stats.seconds += time.perf_counter() - started
+    _io_stats.bytes += len(data)
+    return data
+
+
+def _tree_stats(config):
+    """
+    Count the nodes of a parsed config and find its maximum depth. The memory
+    footprint is estimated with `sys.getsizeof`, counting shared objects once.
+    """
+
+    nodes = max_depth = memory = 0
+    seen = set()
+    stack = [(config, 0)]
+    while stack:
+        obj, depth = stack.pop()
+        nodes += 1
+        max_depth = max(max_depth, depth)
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            memory += sys.getsizeof(obj)
+
+        if isinstance(obj, Mapping):
+            for key, val in obj.items():
+                if id(key) not in seen:
+                    seen.add(id(key))
+                    memory += sys.getsizeof(key)
+                stack.append((val, depth + 1))
+        elif _is_sequence(obj) or isinstance(obj, (set, frozenset)):
+            stack.extend((val, depth + 1) for val in obj)
+
+    return {"nodes": nodes, "max_depth": max_depth, "memory": memory}
 
 
 class MissingVariableError(Exception):
@@ -72,6 +349,21 @@ class MissingVariableError(Exception):
     encapsulates the built-in dict KeyError."""
 
 
+class InterpolationError(Exception):
+    """Error is raised when `${...}` references in a config refer to each
+    other in a cycle. See `konfik.interpolate`."""
+
+
+class StaleConfigError(Exception):
+    """Error is raised when a compiled config is older than the file it was
+    compiled from. See `konfik.compiled`."""
+
+
+class UnknownVariableError(Exception):
+    """Error is raised when a config has a variable that its typed class doesn't
+    define. See `konfik.typed`."""
+
+
 class MissingConfigError(Exception):
     """Error is raised when the configuration file is not found. This
     encapsulates the built-in FileNotFoundError."""
@@ -120,68 +412,1096 @@ class DotMap(dict):
             o = tuple(cls._convert(v) for v in o)
         return o
 
+    @classmethod
+    def _rebuild(cls, old, old_raw, raw):
+        """
+        Convert `raw`, the config that replaces `old_raw`, reusing the values of
+        `old`, the conversion of `old_raw`. Subtrees of `raw` that are the very
+        objects of `old_raw` keep their converted objects from `old`.
+        """
+
+        if raw is old_raw:
+            return old
+        if type(old) is not cls or not (
+            isinstance(raw, dict) and isinstance(old_raw, dict)
+        ):
+            return cls._convert(raw)
+
+        items = {}
+        for key, val in raw.items():
+            if key in old_raw and dict.__contains__(old, key):
+                items[key] = cls._rebuild(dict.__getitem__(old, key), old_raw[key], val)
+            else:
+                items[key] = cls._convert(val)
+        return cls._from_converted(items)
+
+    @classmethod
+    def _from_converted(cls, items):
+        """Create an instance from values that are already converted."""
+
+        new = cls()
+        dict.update(new, items)
+        return new
+
+
+class LazyDotMap(DotMap):
+    """DotMap that converts nested containers the first time they're accessed.
+
+    Nothing is converted upfront. A nested `dict`, `list`, `set` or `tuple` is
+    wrapped when its key is first read and the wrapped value is cached in place,
+    so the cost scales with the keys that are actually accessed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        # Keys whose values have already been wrapped. Bypass `__setattr__`, it
+        # writes to the mapping.
+        object.__setattr__(self, "_converted", set())
+
+    def __getitem__(self, key):
+        val = super().__getitem__(key)
+        if key not in self._converted:
+            val = self._convert(val)
+            dict.__setitem__(self, key, val)
+            self._converted.add(key)
+        return val
+
+    def __setitem__(self, key, val):
+        dict.__setitem__(self, key, val)
+        self._converted.discard(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._converted.discard(key)
+
+    __getattr__ = __getitem__
+    __setattr__ = __setitem__
+    __delattr__ = __delitem__
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    # The `dict` methods that write to the mapping don't go through
+    # `__setitem__`, route them through it to keep `_converted` in sync.
+
+    def update(self, *args, **kwargs):
+        for key, val in dict(*args, **kwargs).items():
+            self[key] = val
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+        val = self[key]
+        del self[key]
+        return val
+
+    def popitem(self):
+        key, val = dict.popitem(self)
+        if key in self._converted:
+            self._converted.discard(key)
+        else:
+            val = self._convert(val)
+        return key, val
+
+    def clear(self):
+        dict.clear(self)
+        self._converted.clear()
+
+    def __reduce__(self):
+        # Unpickling sets items before `_converted` exists, rebuild through
+        # `__init__` instead.
+        return type(self), (dict(self),)
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    @classmethod
+    def _convert(cls, o):
+        """
+        Wrap one level of `o`. Dicts become `LazyDotMap` objects without touching
+        their values; `list`, `set` and `tuple` objects have their items wrapped.
+        """
+        if isinstance(o, LazyDotMap):
+            return o
+        if isinstance(o, dict):
+            o = cls(o)
+        elif isinstance(o, list):
+            o = list(cls._convert(v) for v in o)
+        elif isinstance(o, set):
+            o = set(cls._convert(v) for v in o)
+        elif isinstance(o, tuple):
+            o = tuple(cls._convert(v) for v in o)
+        return o
+
+    @classmethod
+    def _rebuild(cls, old, old_raw, raw):
+        """
+        Wrap `raw` like `DotMap._rebuild`. Only the values that `old` already
+        converted are carried over, the others are wrapped on access as usual.
+        """
+
+        if raw is old_raw and type(old) is cls:
+            return old
+
+        new = cls(raw)
+        if type(old) is not cls or not isinstance(old_raw, dict):
+            return new
+
+        for key in old._converted:
+            if key not in raw or key not in old_raw:
+                continue
+            val, raw_val, old_raw_val = (
+                dict.__getitem__(old, key),
+                raw[key],
+                old_raw[key],
+            )
+            if raw_val is not old_raw_val:
+                if type(val) is not cls or not isinstance(raw_val, dict):
+                    continue
+                val = cls._rebuild(val, old_raw_val, raw_val)
+            dict.__setitem__(new, key, val)
+            new._converted.add(key)
+        return new
+
+
+class FrozenDotMap(DotMap):
+    """Immutable DotMap that can be hashed and shared between threads.
+
+    Keys are interned, nested dicts become `FrozenDotMap` objects, lists become
+    tuples and sets become frozensets. The hash and the repr are computed once
+    and cached, and equality is settled by the cached hashes when they differ.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(
+            self,
+            (
+                (sys.intern(k) if type(k) is str else k, self._convert(v))
+                for k, v in dict(*args, **kwargs).items()
+            ),
+        )
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f"'{type(self).__name__}' object is read-only.")
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = _read_only
+    clear = pop = popitem = setdefault = update = __ior__ = _read_only
+
+    def __hash__(self):
+        # Cached in the instance dict, `__getattr__` would look up a key.
+        try:
+            return self.__dict__["_frozen_hash"]
+        except KeyError:
+            value = hash(frozenset(self.items()))
+            object.__setattr__(self, "_frozen_hash", value)
+            return value
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, FrozenDotMap) and hash(self) != hash(other):
+            return False
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        try:
+            return self.__dict__["_frozen_repr"]
+        except KeyError:
+            value = f"{type(self).__name__}({dict.__repr__(self)})"
+            object.__setattr__(self, "_frozen_repr", value)
+            return value
+
+    def __reduce__(self):
+        # Pickle and copy through `__init__`, item assignment is disabled.
+        return type(self), (dict(self),)
+
+    def __copy__(self):
+        # Immutable, so copies can be the object itself.
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    copy = __copy__
+
+    @classmethod
+    def _from_converted(cls, items):
+        # `_convert` passes frozen values through, so `__init__` keeps them.
+        return cls(items)
+
+    @classmethod
+    def _convert(cls, o):
+        """Recursively freeze `dict`, `list`, `set` and `tuple` objects."""
+
+        if isinstance(o, FrozenDotMap):
+            return o
+        if isinstance(o, dict):
+            o = cls(o)
+        elif isinstance(o, (list, tuple)):
+            o = tuple(cls._convert(v) for v in o)
+        elif isinstance(o, set):
+            o = frozenset(cls._convert(v) for v in o)
+        return o
+
+
+def split_path(path):
+    """
+    Split a dotted path into its keys. A backslash escapes a dot that's part of
+    a key, and a backslash that's part of a key: `a\\.b.c` is `["a.b", "c"]`.
+    """
+
+    if "\\" not in path:
+        return path.split(".")
+
+    keys, key, chars = [], [], iter(path)
+    for char in chars:
+        if char == "\\":
+            key.append(next(chars, "\\"))
+        elif char == ".":
+            keys.append("".join(key))
+            key = []
+        else:
+            key.append(char)
+    keys.append("".join(key))
+    return keys
+
+
+def join_path(keys):
+    """Join keys into a dotted path that `split_path` splits back."""
+
+    return ".".join(str(key).replace("\\", "\\\\").replace(".", "\\.") for key in keys)
+
+
+def _is_sequence(obj):
+    if isinstance(obj, (list, tuple)):
+        return True
+    # Other sequences, like the views of `konfik.binary`.
+    return isinstance(obj, Sequence) and not isinstance(obj, (str, bytes))
+
+
+@lru_cache(maxsize=1024)
+def compile_path(path):
+    """
+    Compile a dotted path into a function that looks it up in a config. Integer
+    keys index into lists, tuples and other sequences. Compiled paths are
+    cached, so repeated lookups of the same path skip the parsing.
+    """
+
+    steps = []
+    for key in split_path(path):
+        try:
+            index = int(key)
+        except ValueError:
+            index = None
+        steps.append((key, index))
+    steps = tuple(steps)
+
+    def lookup(config):
+        obj = config
+        try:
+            for key, index in steps:
+                if index is not None and _is_sequence(obj):
+                    obj = obj[index]
+                else:
+                    obj = obj[key]
+        except (KeyError, IndexError, TypeError):
+            raise MissingVariableError(f"No such variable '{key}' exists.") from None
+        return obj
+
+    return lookup
+
+
+class FlatIndex:
+    """
+    Flat `{"a.b.c": value}` view of a config for constant-time path lookups.
+
+    Every path is indexed, not just the leaves, so `database` and
+    `database.ports.0` are both keys. Dots inside keys are escaped with a
+    backslash like in `split_path`. The index is a snapshot: changes made to
+    the config after it's built aren't reflected.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._paths = {}
+        self._sorted_paths = None
+        self._add(config, "")
+
+    def _add(self, obj, prefix):
+        if isinstance(obj, Mapping):
+            items = obj.items()
+        elif _is_sequence(obj):
+            items = enumerate(obj)
+        else:
+            return
+
+        for key, val in items:
+            key = str(key).replace("\\", "\\\\").replace(".", "\\.")
+            path = f"{prefix}{key}"
+            self._paths[path] = val
+            self._add(val, f"{path}.")
+
+    def __getitem__(self, path):
+        try:
+            return self._paths[path]
+        except KeyError:
+            raise MissingVariableError(f"No such variable '{path}' exists.") from None
+
+    def __contains__(self, path):
+        return path in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def get(self, path, default=None):
+        return self._paths.get(path, default)
+
+    def prefix(self, prefix):
+        """
+        Yield the `(path, value)` pairs whose path starts with `prefix`, in
+        sorted order. Use a trailing dot, like `database.`, to get everything
+        under a key.
+        """
+
+        import bisect
+
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(self._paths)
+
+        paths = self._sorted_paths
+        for i in range(bisect.bisect_left(paths, prefix), len(paths)):
+            if not paths[i].startswith(prefix):
+                break
+            yield paths[i], self._paths[paths[i]]
+
+
+# A source of a layered config, see `Konfik.from_layers`.
+_Layer = namedtuple("_Layer", "source label config signature")
+
+
+def _deep_merge(base, base_origins, override, label):
+    """
+    Merge `override` into `base` without copying the subtrees it doesn't touch.
+    Origins are tracked in a tree of `(label, children)` pairs mirroring the
+    config, where `children` is None below a subtree that came from one source.
+    Returns the merged config and its origin tree.
+    """
+
+    if not (isinstance(base, dict) and isinstance(override, dict)):
+        return override, (label, None)
+
+    base_label, base_children = base_origins
+    if base_children is None:
+        base_children = {key: (base_label, None) for key in base}
+
+    merged = dict(base)
+    children = dict(base_children)
+    for key, val in override.items():
+        if key in base:
+            merged[key], children[key] = _deep_merge(
+                base[key], children[key], val, label
+            )
+        else:
+            merged[key], children[key] = val, (label, None)
+    return merged, (label, children)
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed config files.
+
+    Entries are pickled under `cache_dir` and keyed by the absolute path of the
+    config file. An entry is only used while the file's mtime, size and parser
+    backend match the ones it was stored with. With `hash_content=True`, the
+    file's content hash has to match too, which catches edits that keep the
+    mtime and size intact.
+    """
+
+    def __init__(self, cache_dir=None, hash_content=False):
+        if cache_dir is None:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            cache_dir = os.path.join(cache_home, "konfik")
+
+        self.cache_dir = str(cache_dir)
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, config_path, backend, loader):
+        """Return the parsed config from the cache or parse it with `loader`."""
+
+        import pickle
+
+        abs_path = os.path.abspath(config_path)
+        try:
+            stat = os.stat(abs_path)
+        except OSError:
+            # Let the loader raise its own error.
+            return loader(config_path)
+
+        key = {
+            "path": abs_path,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "backend": backend,
+            "digest": self._digest(abs_path) if self.hash_content else None,
+        }
+        entry_path = self._entry_path(abs_path)
+
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+            if entry["key"] == key:
+                self.hits += 1
+                return entry["config"]
+        except Exception:
+            # Missing, truncated or incompatible entries are just misses.
+            pass
+
+        self.misses += 1
+        config = loader(config_path)
+        self._write(entry_path, {"key": key, "config": config})
+        return config
+
+    def clear(self):
+        """Remove every cached entry."""
+
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pickle"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _entry_path(self, config_path):
+        import hashlib
+
+        name = hashlib.sha1(config_path.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pickle")
+
+    @staticmethod
+    def _digest(config_path):
+        import hashlib
+
+        with open(config_path, "rb") as f:
+            return hashlib.blake2b(f.read()).hexdigest()
+
+    def _write(self, entry_path, entry):
+        import pickle
+        import tempfile
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file first so that concurrent readers never
+            # see a half-written entry.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except (OSError, pickle.PicklingError, TypeError):
+            # Caching is best-effort; the parsed config is still returned.
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
 
 class Konfik:
     """Primary class that holds all the public APIs."""
 
+    # Instances handed out by `Konfik.shared`, least recently used first.
+    _shared = OrderedDict()
+    _shared_lock = threading.Lock()
+    shared_maxsize = 32
+
+    # Handle on the memory of a config attached with `Konfik.attach`.
+    _attachment = None
+    # Arguments of `Konfik.from_directory`, to scan the directory on reload.
+    _directory = None
+
+    # Dotted paths that changed in the last reload, `None` before any reload.
+    changes = None
+    _hash_tree_cache = None
+
     def __init__(
         self,
         config_path,
         dotmap_cls=DotMap,
+        cache=None,
+        interpolate=False,
     ):
         self._config_path = config_path
+        self._cache = cache
+        self._dotmap_cls = dotmap_cls
+        self._interpolate = interpolate
+        self._index = None
+        self._layers = None
+        self._load_stats = _new_load_stats()
+        self._tree_stats_cache = None
         self._config_ext = str(self._config_path).split(".")[-1]
-        self._config_raw = self._load_config()
-        self.config = dotmap_cls(self._config_raw)
+        self._swap(self._load_config())
+
+    @classmethod
+    def shared(cls, config_path, dotmap_cls=DotMap):
+        """
+        Return a process-wide instance for `config_path`. The file is parsed on
+        the first call and again only when its mtime or size has changed since.
+        Paths that resolve to the same file share an instance. At most
+        `shared_maxsize` instances are kept, the least recently used ones are
+        evicted first.
+        """
 
-    def show_config(self):
-        """Printing evaluated config file as a Python dict."""
+        real_path = os.path.realpath(config_path)
+        try:
+            stat = os.stat(real_path)
+        except OSError:
+            # Let the loader raise its own error.
+            return cls(config_path, dotmap_cls=dotmap_cls)
 
-        colorize.colorize_entity(self._config_raw)
+        key = (cls, real_path, dotmap_cls)
+        version = (stat.st_mtime_ns, stat.st_size)
 
-    def show_config_literal(self):
-        """Print literal config file contents."""
+        with cls._shared_lock:
+            entry = cls._shared.get(key)
+            if entry is not None and entry[0] == version:
+                cls._shared.move_to_end(key)
+                return entry[1]
+
+            konfik = cls(real_path, dotmap_cls=dotmap_cls)
+            cls._shared[key] = (version, konfik)
+            cls._shared.move_to_end(key)
+            while len(cls._shared) > cls.shared_maxsize:
+                cls._shared.popitem(last=False)
+            return konfik
+
+    @classmethod
+    def invalidate(cls, config_path=None):
+        """
+        Drop the shared instances of `config_path`, or all of them when no path
+        is given. The next `Konfik.shared` call parses the file again.
+        """
 
-        with open(self._config_path) as f:
-            config_str = f.read()
-            colorize.colorize_config(config_str, self._config_ext)
+        with cls._shared_lock:
+            if config_path is None:
+                cls._shared.clear()
+                return
 
-    def show_config_var(self, query):
-        """Print the config variables."""
+            real_path = os.path.realpath(config_path)
+            for key in [k for k in cls._shared if k[1] == real_path]:
+                del cls._shared[key]
 
-        if isinstance(query, str):
-            query_lst = query.split(".")
-            value = self.get_by_path(self._config_raw, query_lst)
-            colorize.colorize_entity(value)
+    @classmethod
+    def from_layers(cls, sources, dotmap_cls=DotMap, cache=None, interpolate=False):
+        """
+        Deep-merge an ordered list of sources into one config, later sources
+        overriding earlier ones. A source is either a config file path or a
+        mapping such as a dict built from `os.environ`.
+
+        The merge shares every subtree that no later source overrides, so only
+        the overridden paths are copied. `origin(path)` tells which source a
+        value came from. On `reload`, only the sources that changed are read
+        again, and the merge is redone from the first changed source on.
+        """
 
-    def _load_config(self):
-        """Load config.toml file."""
+        konfik = cls._without_file(dotmap_cls, cache, interpolate)
+        konfik._layers = [
+            konfik._load_layer(source, i) for i, source in enumerate(sources)
+        ]
+        # `_merged[i]` is the merge of the first i + 1 layers and its origin tree.
+        konfik._merged = []
+        konfik._swap(konfik._merge_layers(0))
+        return konfik
 
-        # Making sure that pathlib.Path object are converted to string
-        if self._config_path:
-            config_path = str(self._config_path)
+    @classmethod
+    def from_directory(
+        cls, path, pattern="*", workers=None, merge=False, dotmap_cls=DotMap
+    ):
+        """
+        Load every config file in the `path` directory whose name matches
+        `pattern`, parsing them in parallel with up to `workers` workers.
+        Threads are used when every file is handled by a C parser and a process
+        pool otherwise, since the pure-Python parsers hold the GIL.
+
+        Files are handled in filename order. With `merge=False` each config is
+        put under its filename without the extension. With `merge=True` they
+        are deep-merged, later filenames overriding earlier ones.
+
+        `report` holds the backend, parse time and error of every file. Files
+        that fail to parse are left out of the config, as are files whose name
+        without the extension is taken by an earlier file when `merge=False`. `reload` scans the
+        directory again.
+        """
 
-            if self._config_ext == "env":
-                return self._load_env(config_path)
+        konfik = cls._without_file(dotmap_cls, None)
+        konfik._directory = (path, pattern, workers, merge)
+        konfik.report, config_raw = cls._scan_directory(*konfik._directory)
+        konfik._swap(config_raw)
+        return konfik
 
-            elif self._config_ext == "json":
-                return self._load_json(config_path)
+    @staticmethod
+    def _scan_directory(path, pattern, workers, merge):
+        """Parse the files of `from_directory`, returns the report and config."""
 
-            elif self._config_ext == "toml":
-                return self._load_toml(config_path)
+        import fnmatch
 
-            elif self._config_ext == "yaml" or self._config_ext == "yml":
-                return self._load_yaml(config_path)
+        names = sorted(
+            name
+            for name in os.listdir(path)
+            if fnmatch.fnmatch(name, pattern)
+            and os.path.isfile(os.path.join(path, name))
+            and name.split(".")[-1] in _backends
+        )
+        paths = [os.path.join(str(path), name) for name in names]
+
+        def threads_suffice(config_path):
+            ext = config_path.split(".")[-1]
+            # User-registered loaders don't exist in a freshly spawned process.
+            if _backends[ext] is not _BUILTIN_BACKENDS.get(ext):
+                return True
+            return _pick_backend(config_path)[0] in _C_BACKENDS
+
+        if workers == 1 or len(paths) <= 1:
+            results = [_parse_timed(p) for p in paths]
+        else:
+            from concurrent import futures
+
+            if all(threads_suffice(p) for p in paths):
+                executor = futures.ThreadPoolExecutor(max_workers=workers)
+            else:
+                executor = futures.ProcessPoolExecutor(max_workers=workers)
+            with executor:
+                results = list(executor.map(_parse_timed, paths))
+
+        report = []
+        config_raw, origins = {}, (None, {})
+        for name, config_path, (backend, config, error, seconds) in zip(
+            names, paths, results
+        ):
+            key = name.rsplit(".", 1)[0]
+            if error is None and not merge and key in config_raw:
+                error = ValueError(f"'{key}' is already loaded from another file")
+            report.append(
+                {
+                    "path": config_path,
+                    "backend": backend,
+                    "seconds": seconds,
+                    "error": error,
+                }
+            )
+            if error is not None:
+                continue
 
+            if merge:
+                config_raw, origins = _deep_merge(config_raw, origins, config, name)
             else:
-                raise NotImplementedError(
-                    f"Config type '{self._config_ext}' is not supported."
+                config_raw[key] = config
+
+        return report, config_raw
+
+    @classmethod
+    def _without_file(cls, dotmap_cls, cache, interpolate=False):
+        """Create an instance that isn't backed by a single config file."""
+
+        konfik = cls.__new__(cls)
+        konfik._config_path = None
+        konfik._config_ext = None
+        konfik._cache = cache
+        konfik._dotmap_cls = dotmap_cls
+        konfik._interpolate = interpolate
+        konfik._index = None
+        konfik._layers = None
+        konfik._load_stats = _new_load_stats()
+        konfik._tree_stats_cache = None
+        konfik.backend = None
+        return konfik
+
+    def publish(self, name=None, path=None):
+        """
+        Publish the config to shared memory so that other processes can
+        `attach` to it instead of loading the file themselves. Returns a
+        `konfik.shm.Publication`; unlink it when no process will attach anymore.
+        """
+
+        from konfik.shm import publish
+
+        return publish(self._resolved(), name=name, path=path)
+
+    @classmethod
+    def attach(cls, name=None, path=None):
+        """
+        Attach to a config published with `publish`. The config is read in
+        place through a read-only view and is never copied as a whole into the
+        process. It doesn't follow later publications, so it can't be reloaded.
+        """
+
+        from konfik.shm import attach
+
+        konfik = cls._without_file(DotMap, None)
+        config, konfik._attachment = attach(name=name, path=path)
+        konfik._config_raw = konfik.config = config
+        konfik.backend = "shared_memory" if path is None else "mmap"
+        return konfik
+
+    @classmethod
+    async def aload(cls, config_path, dotmap_cls=DotMap, cache=None, executor=None):
+        """
+        Load a config without blocking the event loop. The file is read and
+        parsed in `executor`, the loop's default executor if it's not given.
+        """
+
+        import asyncio
+        from functools import partial
+
+        loop = asyncio.get_event_loop()
+        load = partial(cls, config_path, dotmap_cls=dotmap_cls, cache=cache)
+        return await loop.run_in_executor(executor, load)
+
+    @classmethod
+    async def aload_many(
+        cls, config_paths, limit=8, dotmap_cls=DotMap, cache=None, executor=None
+    ):
+        """
+        Load several configs concurrently, at most `limit` at a time. Returns
+        the instances in the order of `config_paths`.
+        """
+
+        import asyncio
+
+        semaphore = asyncio.Semaphore(limit)
+
+        async def load(config_path):
+            async with semaphore:
+                return await cls.aload(
+                    config_path, dotmap_cls=dotmap_cls, cache=cache, executor=executor
                 )
 
+        return await asyncio.gather(*(load(path) for path in config_paths))
+
+    def _load_layer(self, source, position):
+        if isinstance(source, Mapping):
+            label = "<environ>" if source is os.environ else f"<mapping {position}>"
+            return _Layer(source, label, dict(source), None)
+
+        stat = os.stat(source) if os.path.exists(source) else None
+        signature = stat and (stat.st_mtime_ns, stat.st_size)
+        return _Layer(source, str(source), self._load_config(source), signature)
+
+    def _merge_layers(self, start):
+        """Merge the layers from `start` on over the merged earlier layers."""
+
+        merged = self._merged[:start]
+        config_raw, origins = merged[-1] if merged else ({}, (None, {}))
+        for layer in self._layers[start:]:
+            config_raw, origins = _deep_merge(
+                config_raw, origins, layer.config, layer.label
+            )
+            merged.append((config_raw, origins))
+
+        self._merged = merged
+        return config_raw
+
+    def _reload_layers(self):
+        """Read the changed layers again and redo the merge from the first one."""
+
+        layers = list(self._layers)
+        changed = []
+        for i, layer in enumerate(layers):
+            if isinstance(layer.source, Mapping):
+                if dict(layer.source) != layer.config:
+                    layers[i] = self._load_layer(layer.source, i)
+                    changed.append(i)
+                continue
+
+            try:
+                stat = os.stat(layer.source)
+                signature = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signature = None
+            if signature is None or signature != layer.signature:
+                layers[i] = self._load_layer(layer.source, i)
+                changed.append(i)
+
+        if not changed:
+            return None
+
+        self._layers = layers
+        return self._merge_layers(changed[0])
+
+    def origin(self, path):
+        """
+        Return the source the value at the dotted `path` came from, for a config
+        built with `from_layers`.
+        """
+
+        if self._layers is None:
+            return str(self._config_path)
+
+        label, children = self._merged[-1][1]
+        for key in split_path(path):
+            if children is None:
+                return label
+            try:
+                label, children = children[key]
+            except KeyError:
+                raise MissingVariableError(
+                    f"No such variable '{key}' exists."
+                ) from None
+        return label
+
+    @property
+    def index(self):
+        """
+        `FlatIndex` of the config, built on first access. It's rebuilt after
+        the config is reloaded.
+        """
+
+        index = self._index
+        if index is None or index.config is not self.config:
+            index = self._index = FlatIndex(self.config)
+        return index
+
+    def reload(self):
+        """
+        Parse the config file again and swap in the new config. Readers see
+        either the old or the new config, never a partially built one. If
+        parsing fails, the error is raised and the current config is kept.
+        The dotted paths that changed are listed in `changes`.
+        """
+
+        if self._attachment is not None:
+            raise NotImplementedError(
+                "Attached configs can't be reloaded, attach to a new publication."
+            )
+
+        if self._directory is not None:
+            self._load_stats = _new_load_stats()
+            self.report, config_raw = self._scan_directory(*self._directory)
+            self._swap(config_raw)
+            return
+
+        if self._layers is not None:
+            self._load_stats = _new_load_stats()
+            config_raw = self._reload_layers()
+            if config_raw is not None:
+                self._swap(config_raw)
+            else:
+                self.changes = []
+            return
+
+        self._load_stats = _new_load_stats()
+        self._swap(self._load_config())
+
+    def _swap(self, config_raw):
+        if self._interpolate and self._interpolate != "lazy":
+            from konfik.interpolate import resolve
+
+            started = time.perf_counter()
+            config_raw = resolve(config_raw)
+            self._load_stats["interpolate"] = time.perf_counter() - started
+
+        old_raw = getattr(self, "_config_raw", None)
+        if old_raw is not None:
+            started = time.perf_counter()
+            config_raw = self._track_changes(config_raw)
+            self._load_stats["diff"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if self._interpolate == "lazy":
+            from konfik.interpolate import LazyResolvedDotMap
+
+            config = LazyResolvedDotMap.from_config(config_raw)
+        elif (
+            old_raw is not None
+            and type(self.config) is self._dotmap_cls
+            and hasattr(self._dotmap_cls, "_rebuild")
+        ):
+            # Keep the converted objects of the subtrees that didn't change.
+            config = self._dotmap_cls._rebuild(self.config, old_raw, config_raw)
+        else:
+            config = self._dotmap_cls(config_raw)
+        self._load_stats["convert"] = time.perf_counter() - started
+        self._config_raw, self.config = config_raw, config
+
+        if _stats_hooks:
+            stats = self.stats
+            for hook in _stats_hooks:
+                hook(self, stats)
+
+    def _hash_tree(self):
+        """The current config and the `konfik.merkle` hash tree of it."""
+
+        from konfik.merkle import hash_tree
+
+        config_raw = self._config_raw
+        cached = self._hash_tree_cache
+        if cached is None or cached[0] is not config_raw:
+            cached = self._hash_tree_cache = (config_raw, hash_tree(config_raw))
+        return cached
+
+    def _track_changes(self, config_raw):
+        """
+        Record the paths that differ between the current config and
+        `config_raw` in `changes`, and return `config_raw` with its unchanged
+        subtrees taken from the current config.
+        """
+
+        from konfik.merkle import diff, hash_tree, reuse
+
+        old_raw, old_tree = self._hash_tree()
+        new_tree = hash_tree(config_raw)
+        self.changes = diff(old_raw, config_raw, old_tree, new_tree)
+        config_raw = reuse(old_raw, config_raw, old_tree, new_tree)
+        self._hash_tree_cache = (config_raw, new_tree)
+        return config_raw
+
+    @property
+    def stats(self):
+        """
+        Timings of the last load in seconds, split into file I/O, parsing,
+        interpolation, finding the changes since the previous load and DotMap
+        conversion, plus the time spent rendering output for the CLI. Also holds the bytes read, the node count, the
+        maximum depth and the estimated memory footprint of the parsed config
+        in bytes.
+        """
+
+        config_raw = self._config_raw
+        cached = self._tree_stats_cache
+        if cached is None or cached[0] is not config_raw:
+            cached = self._tree_stats_cache = (config_raw, _tree_stats(config_raw))
+        return dict(self._load_stats, **cached[1])
+
+    def watch(self, interval=1.0, on_reload=None, on_error=None, use_inotify=None):
+        """
+        Reload the config in a background thread whenever the file changes.
+        Changes are picked up through inotify on Linux and by polling the file
+        every `interval` seconds elsewhere. See `konfik.watch.Reloader` for the
+        hooks. Returns the started reloader; call its `stop` method to stop
+        watching.
+        """
+
+        from konfik.watch import Reloader
+
+        if self._layers is not None:
+            raise NotImplementedError(
+                "Layered configs can't be watched, call `reload` instead."
+            )
+        if self._directory is not None:
+            raise NotImplementedError(
+                "Directory configs can't be watched, call `reload` instead."
+            )
+
+        reloader = Reloader(
+            self,
+            interval=interval,
+            on_reload=on_reload,
+            on_error=on_error,
+            use_inotify=use_inotify,
+        )
+        reloader.start()
+        return reloader
+
+    def show_config(self, max_depth=None, max_items=None):
+        """
+        Printing evaluated config file as a Python dict. Containers nested more
+        than `max_depth` levels deep are collapsed and only `max_items` items of
+        each container are printed.
+        """
+
+        started = time.perf_counter()
+        _colorize().colorize_entity(self._resolved(), max_depth, max_items)
+        self._load_stats["render"] = time.perf_counter() - started
+
+    def _resolved(self, query=None):
+        """
+        Return the parsed config, or the value at the dotted `query` path in
+        it. With `interpolate="lazy"` the parsed config keeps its references,
+        so the returned value is resolved here.
+        """
+
+        value = self._config_raw
+        if query is not None:
+            value = compile_path(query)(value)
+        if self._interpolate != "lazy":
+            return value
+
+        resolver = self.config._resolver
+        path = join_path(split_path(query)) if query is not None else ""
+        with resolver.lock:
+            return resolver.resolve(value, path)
+
+    def show_config_literal(self):
+        """Print literal config file contents."""
+
+        started = time.perf_counter()
+        _colorize().colorize_file(self._config_path, self._config_ext)
+        self._load_stats["render"] = time.perf_counter() - started
+
+    def show_config_var(self, query, max_depth=None, max_items=None):
+        """Print the config variables, bounded like `show_config`."""
+
+        if isinstance(query, str):
+            value = self._resolved(query)
+            started = time.perf_counter()
+            _colorize().colorize_entity(value, max_depth, max_items)
+            self._load_stats["render"] = time.perf_counter() - started
+
+    def get(self, path, default=_MISSING):
+        """
+        Look up a dotted path like `database.ports.0` in the config. Integer
+        keys index into lists and a backslash escapes dots inside keys. Raises
+        `MissingVariableError` if the path doesn't exist and no default is given.
+        """
+
+        try:
+            return compile_path(path)(self.config)
+        except MissingVariableError:
+            if default is _MISSING:
+                raise
+            return default
+
+    def _load_config(self, config_path=None):
+        """Load the config file, or `config_path` when it's given."""
+
+        config_path = config_path or self._config_path
+
+        if config_path:
+            _io_stats.reset()
+            started = time.perf_counter()
+            self.backend, config = _parse(config_path, self._cache)
+            elapsed = time.perf_counter() - started
+
+            # Loaders that don't read through `_read_file` count as parsing.
+            self._load_stats["io"] += _io_stats.seconds
+            self._load_stats["parse"] += elapsed - _io_stats.seconds
+            self._load_stats["bytes_read"] += _io_stats.bytes
+            return config
+
     @staticmethod
     def _load_env(config_path):
         """Load .env file."""
 
+        import io
+
+        from dotenv import dotenv_values, find_dotenv
+
         try:
             # Instead of using `load_dotenv()``, this is done to avoid recursively searching for dotenv file.
             # There is no element of surprise. If the file is not found in the explicit path, this will raise an error!
@@ -190,7 +1510,8 @@ class Konfik:
             )
 
             if dotenv_file:
-                config = dotenv_values(dotenv_file)
+                data = _read_file(dotenv_file)
+                config = dotenv_values(stream=io.StringIO(data.decode()))
                 return config
 
         except OSError:
@@ -198,10 +1519,13 @@ class Konfik:
 
     @staticmethod
     def _load_json(config_path):
+        """Load .json file."""
+
+        _, loads = _json_parser()
+
         try:
-            with open(config_path) as f:
-                config = json.load(f)
-                return config
+            config = loads(_read_file(config_path))
+            return config
         except FileNotFoundError:
             raise MissingConfigError("JSON file not found.")
 
@@ -209,23 +1533,40 @@ class Konfik:
     def _load_toml(config_path):
         """Load .toml file."""
 
-        # FileNotFound & TomlDecodeError will be raised.
+        _, loads = _toml_parser()
+
+        # FileNotFound & the parser's decode error will be raised.
         try:
-            config = toml.load(config_path)
+            config = loads(_read_file(config_path).decode())
             return config
 
         except FileNotFoundError:
             raise MissingConfigError("TOML file not found.") from None
 
     @staticmethod
-    def _load_yaml(config_path):
+    def _load_yaml(config_path, loader=None):
+        """Load .yaml file with `loader`, libyaml's loader if it's not given."""
+
+        import yaml
+
+        loader = loader or _yaml_loader()
         try:
-            with open(config_path) as f:
-                config = yaml.safe_load(f)
-                return config
+            config = yaml.load(_read_file(config_path), Loader=loader)
+            return config
         except FileNotFoundError:
             raise MissingConfigError("YAML file not found.")
 
+    @staticmethod
+    def _load_kfc(config_path):
+        """Load a .kfc file compiled with `konfik compile`."""
+
+        from konfik.compiled import load_compiled
+
+        try:
+            return load_compiled(config_path)
+        except FileNotFoundError:
+            raise MissingConfigError("KFC file not found.") from None
+
     @staticmethod
     def get_by_path(dct, key_list):
         """Access a nested object in root by item sequence."""
@@ -238,15 +1579,115 @@ class Konfik:
             ) from None
 
 
+# Maps config file extensions to functions that pick a backend. A backend is a
+# `(name, loader)` pair where the loader takes a config path and returns the
+# parsed config. Backends are picked on dispatch, so a parser isn't imported until
+# a config of its type is loaded.
+_backends = {
+    "env": lambda: ("dotenv", Konfik._load_env),
+    "json": lambda: (_json_parser()[0], Konfik._load_json),
+    "toml": lambda: (_toml_parser()[0], Konfik._load_toml),
+    "yaml": lambda: (f"yaml.{_yaml_loader().__name__}", Konfik._load_yaml),
+    "yml": lambda: (f"yaml.{_yaml_loader().__name__}", Konfik._load_yaml),
+    "kfc": lambda: ("kfc", Konfik._load_kfc),
+}
+_BUILTIN_BACKENDS = dict(_backends)
+
+
+def _pick_backend(config_path):
+    """Return the `(name, loader)` backend for the extension of `config_path`."""
+
+    config_ext = str(config_path).split(".")[-1]
+    try:
+        pick_backend = _backends[config_ext]
+    except KeyError:
+        raise NotImplementedError(
+            f"Config type '{config_ext}' is not supported."
+        ) from None
+    return pick_backend()
+
+
+def _parse(config_path, cache=None):
+    """Parse a config file, returns the backend name and the parsed config."""
+
+    # Making sure that pathlib.Path object are converted to string
+    config_path = str(config_path)
+    backend, loader = _pick_backend(config_path)
+    # Compiled configs are mapped, there's nothing to parse or cache.
+    if cache is not None and backend != "kfc":
+        return backend, cache.load(config_path, backend, loader)
+    return backend, loader(config_path)
+
+
+def _parse_timed(config_path):
+    """
+    Parse one file of `Konfik.from_directory`. It runs in a worker, so errors
+    are returned along with the timing instead of being raised.
+    """
+
+    import time
+
+    started = time.perf_counter()
+    try:
+        backend, config = _parse(config_path)
+        error = None
+    except Exception as exc:
+        backend, config, error = None, None, exc
+    return backend, config, error, time.perf_counter() - started
+
+
+# Functions called with `(konfik, stats)` after every load and reload.
+_stats_hooks = []
+
+
+def _new_load_stats():
+    return {
+        "io": 0.0,
+        "parse": 0.0,
+        "interpolate": 0.0,
+        "diff": 0.0,
+        "convert": 0.0,
+        "render": 0.0,
+        "bytes_read": 0,
+    }
+
+
+def register_stats_hook(hook):
+    """
+    Call `hook(konfik, stats)` after every config load and reload, with the
+    same numbers as `Konfik.stats`. Use it to forward them to a metrics system.
+    """
+
+    _stats_hooks.append(hook)
+
+
+# Backends that parse in C. Threads are enough to load these in parallel,
+# everything else goes to a process pool. Compiled configs aren't parsed at all,
+# and their views can't be sent back from another process.
+_C_BACKENDS = {"json", "orjson", "yaml.CSafeLoader", "kfc"}
+
+
+def register_loader(ext, loader, name=None):
+    """
+    Load config files with the `ext` extension using `loader`. The loader takes
+    the config path and returns the parsed config. `name` is reported through
+    `Konfik.backend` and defaults to the loader's name. Registering an extension
+    that's already supported replaces its built-in backend.
+    """
+
+    name = name or getattr(loader, "__name__", repr(loader))
+    _backends[ext.lstrip(".")] = lambda: (name, loader)
+
+
 class KonfikCLI:
     """Access and show config variables using the CLI."""
 
+    title = "\nKonfik -- The strangely familiar config parser ⚙️\n"
+
     def build_parser(self):
-        parser = argparse.ArgumentParser(
-            description=colorize.colorize_title(
-                "\nKonfik -- The strangely familiar config parser ⚙️\n"
-            )
-        )
+        import argparse
+
+        parser = argparse.ArgumentParser(description=self.title)
 
         # Add arguments.
         parser.add_argument("--path", help="add config file path")
@@ -260,13 +1701,68 @@ class KonfikCLI:
             action="store_true",
             help="print config file content literally",
         )
-        parser.add_argument("--var", help="print config variable")
+        parser.add_argument(
+            "--var",
+            action="append",
+            help="print config variable, can be given more than once",
+        )
+        parser.add_argument(
+            "--max-depth",
+            type=int,
+            help="collapse containers nested deeper than this in --show and --var",
+        )
+        parser.add_argument(
+            "--max-items",
+            type=int,
+            help="print only this many items of each container",
+        )
+        parser.add_argument(
+            "--export",
+            choices=["shell", "env", "ndjson"],
+            help="print the variables under --var, or all of them, in one go",
+        )
+        parser.add_argument(
+            "--cache-dir",
+            help="cache the parsed config file in this directory",
+        )
+        parser.add_argument(
+            "--gen-classes",
+            action="store_true",
+            help="print typed config classes derived from the config",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="print where the time and memory of loading the config went",
+        )
         parser.add_argument(
             "--version",
             action="store_true",
             help="print konfik-cli version number",
         )
 
+        commands = parser.add_subparsers(dest="command", metavar="command")
+        compile_parser = commands.add_parser(
+            "compile", help="compile a config file into a binary .kfc snapshot"
+        )
+        compile_parser.add_argument("source", help="config file to compile")
+        compile_parser.add_argument(
+            "-o", "--output", help="output path, the source with a .kfc extension"
+        )
+        serve_parser = commands.add_parser(
+            "serve", help="keep configs in memory and answer --var and --show"
+        )
+        serve_parser.add_argument(
+            "--socket", help="Unix socket to listen on, $KONFIK_SOCKET by default"
+        )
+        diff_parser = commands.add_parser(
+            "diff", help="print the dotted paths that differ between two configs"
+        )
+        diff_parser.add_argument("old", help="config file to compare against")
+        diff_parser.add_argument("new", help="config file to compare")
+
+        # Arguments of the subcommands, they don't need --path.
+        self.command_args = {"command", "source", "output", "socket", "old", "new"}
         return parser
 
     def raise_arg_error(self, parser, args):
@@ -278,33 +1774,148 @@ class KonfikCLI:
             if k == "path":
                 continue
 
+            if k in self.command_args:
+                continue
+
             if v and not args.path:
                 parser.error(f"The --{k} argument requires the --path argument.")
 
-    def trigger_handler(self, args, konfik_cls=Konfik, version=__version__):
+    def can_use_daemon(self, args, konfik_cls):
+        """
+        Tell if the query can be sent to `konfik serve`. That's the case for
+        `--var` and `--show` when nothing else is asked of the config. Set
+        `KONFIK_NO_DAEMON` to always handle queries in-process.
+        """
+
+        if not (args.var or args.show) or args.show_literal or args.cache_dir:
+            return False
+        if args.stats or args.gen_classes or args.export:
+            return False
+        if not args.show and len(args.var) > 1:
+            return False
+        return konfik_cls is Konfik and not os.environ.get("KONFIK_NO_DAEMON")
+
+    def can_stream_var(self, args, konfik_cls):
+        """
+        Tell if `--var` can be answered by streaming the file instead of
+        loading all of it. That's the case for large JSON and YAML files when
+        nothing else is asked of the config.
+        """
+
+        if not args.var or args.show or args.show_literal or args.cache_dir:
+            return False
+        if args.stats or args.gen_classes or args.export or len(args.var) > 1:
+            return False
+        if konfik_cls is not Konfik:
+            return False
+
+        from konfik.stream import can_stream
+
+        return can_stream(args.path)
+
+    def trigger_handler(self, args, konfik_cls=Konfik, version=None):
         if args.version:
-            colorize.colorize_entity(version)
+            _colorize().colorize_entity(version or _get_version())
+
+        if args.command == "compile":
+            from konfik.compiled import compile_config
+
+            print(compile_config(args.source, args.output))
+            return
+
+        if args.command == "serve":
+            from konfik.daemon import serve
+
+            serve(args.socket)
+            return
+
+        if args.command == "diff":
+            from konfik.merkle import diff
+
+            old, new = (konfik_cls(path)._config_raw for path in (args.old, args.new))
+            changes = diff(old, new)
+            for path in changes:
+                print(path)
+            # Exit with 1 when the configs differ, like diff(1).
+            return 1 if changes else 0
 
         if args.path:
-            konfik = konfik_cls(args.path)
+            if self.can_use_daemon(args, konfik_cls):
+                from konfik.daemon import query
+
+                request = {
+                    "path": os.path.abspath(args.path),
+                    "max_depth": args.max_depth,
+                    "max_items": args.max_items,
+                }
+                if not args.show:
+                    request["var"] = args.var[0]
+                reply = query(request)
+                # On errors the query is handled here, which reports the error.
+                if reply is not None and "text" in reply:
+                    _colorize().colorize_formatted(reply["text"])
+                    return
+            if self.can_stream_var(args, konfik_cls):
+                from konfik.stream import extract
+
+                value = extract(args.path, args.var[0])
+                _colorize().colorize_entity(value, args.max_depth, args.max_items)
+                return
+
+            if args.cache_dir:
+                konfik = konfik_cls(args.path, cache=ParseCache(args.cache_dir))
+            else:
+                konfik = konfik_cls(args.path)
+
+            if args.export:
+                from konfik.export import export_lines
 
-            if args.show:
-                konfik.show_config()
+                for line in export_lines(konfik._resolved(), args.export, args.var):
+                    print(line)
+            elif args.show:
+                konfik.show_config(args.max_depth, args.max_items)
             elif args.show_literal:
                 konfik.show_config_literal()
             elif args.var:
-                konfik.show_config_var(args.var)
+                for var in args.var:
+                    konfik.show_config_var(var, args.max_depth, args.max_items)
+            elif args.gen_classes:
+                from konfik.typed import derive, generate_source
+
+                print(generate_source(derive(konfik._resolved())), end="")
+
+            if args.stats:
+                self.print_stats(konfik.stats)
+
+    def print_stats(self, stats):
+        """Print the load breakdown to stderr, so it doesn't mix with the output."""
+
+        lines = [
+            f"{phase:<10} {stats[phase] * 1000:>10.3f} ms"
+            for phase in ("io", "parse", "interpolate", "diff", "convert", "render")
+        ]
+        lines.append(f"{'bytes_read':<10} {stats['bytes_read']:>10}")
+        lines.append(f"{'nodes':<10} {stats['nodes']:>10}")
+        lines.append(f"{'max_depth':<10} {stats['max_depth']:>10}")
+        lines.append(f"{'memory':<10} {stats['memory']:>10} bytes")
+        sys.stderr.write("\n".join(lines) + "\n")
 
 
 def cli_entrypoint(argv=None):
     """CLI entrypoint callable."""
 
+    _colorize().install_excepthook()
+
     konfik_cli = KonfikCLI()
     parser = konfik_cli.build_parser()
     args = parser.parse_args(argv)
 
+    # Exports and diffs are read by programs, they get nothing but the output.
+    if not (args.export or args.command == "diff"):
+        _colorize().colorize_title(konfik_cli.title)
+
     konfik_cli.raise_arg_error(parser, args)
-    konfik_cli.trigger_handler(args)
+    return konfik_cli.trigger_handler(args)
 
 
 # if __name__ == "__main__":
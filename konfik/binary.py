@@ -0,0 +1,322 @@
+"""
+Compact binary encoding of a parsed config that's read in place.
+
+Every value is a node that starts with a one-byte tag. Mappings and lists hold a
+table of offsets to their items, and items are written before the containers
+that refer to them. Equal strings, which are mostly keys repeated across
+mappings, are stored once.
+
+`load` doesn't decode anything upfront. It returns a read-only view over the
+buffer, and each mapping or list decodes its own table the first time it's
+accessed, so a process only pays for the parts of the config it reads.
+
+Besides JSON types, integers of any size, the dates and times of TOML and YAML
+and sets have their own tags. Datetimes and times keep their UTC offset as a
+fixed `timezone`, and sets are read back as frozensets. Nothing is pickled, so
+loading a buffer never runs code, and `dumps` raises `TypeError` for values of
+any other type.
+"""
+
+import datetime
+import struct
+from collections.abc import Mapping, Sequence
+
+from konfik import MissingVariableError
+
+MAGIC = b"KFKB"
+VERSION = 2
+
+# magic, format version, reserved, offset of the root node
+_HEADER = struct.Struct("<4sHHQ")
+_SIZE = struct.Struct("<Q")
+_PAIR = struct.Struct("<QQ")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+# year, month, day
+_DATE = struct.Struct("<HBB")
+# hour, minute, second, microsecond, has a UTC offset, the offset in microseconds
+_TIME = struct.Struct("<BBBI?q")
+
+_NONE, _TRUE, _FALSE = b"N", b"T", b"F"
+_INT_TAG, _FLOAT_TAG, _STR, _DICT, _LIST = b"i", b"f", b"s", b"d", b"l"
+_BIG_INT, _DATETIME_TAG, _DATE_TAG, _TIME_TAG, _SET = b"I", b"D", b"a", b"t", b"S"
+
+
+def _pack_time(value):
+    offset = value.utcoffset()
+    return _TIME.pack(
+        value.hour,
+        value.minute,
+        value.second,
+        value.microsecond,
+        offset is not None,
+        0 if offset is None else offset // datetime.timedelta(microseconds=1),
+    )
+
+
+def _unpack_time(buf, offset):
+    hour, minute, second, microsecond, has_offset, utc_offset = _TIME.unpack_from(
+        buf, offset
+    )
+    tz = None
+    if has_offset:
+        tz = datetime.timezone(datetime.timedelta(microseconds=utc_offset))
+    return hour, minute, second, microsecond, tz
+
+
+class _Encoder:
+    def __init__(self):
+        self.buf = bytearray(_HEADER.size)
+        self.strings = {}
+
+    def emit(self, *parts):
+        offset = len(self.buf)
+        for part in parts:
+            self.buf += part
+        return offset
+
+    def encode(self, obj):
+        """Write `obj` and return the offset of its node."""
+
+        if obj is None:
+            return self.emit(_NONE)
+        if obj is True:
+            return self.emit(_TRUE)
+        if obj is False:
+            return self.emit(_FALSE)
+        if type(obj) is int:
+            if -(1 << 63) <= obj < 1 << 63:
+                return self.emit(_INT_TAG, _INT.pack(obj))
+            data = str(obj).encode()
+            return self.emit(_BIG_INT, _SIZE.pack(len(data)), data)
+        if type(obj) is float:
+            return self.emit(_FLOAT_TAG, _FLOAT.pack(obj))
+
+        if isinstance(obj, str):
+            offset = self.strings.get(obj)
+            if offset is None:
+                data = obj.encode("utf-8", "surrogatepass")
+                offset = self.emit(_STR, _SIZE.pack(len(data)), data)
+                self.strings[obj] = offset
+            return offset
+
+        if isinstance(obj, Mapping):
+            pairs = [(self.encode(k), self.encode(v)) for k, v in obj.items()]
+            table = b"".join(_PAIR.pack(*pair) for pair in pairs)
+            return self.emit(_DICT, _SIZE.pack(len(pairs)), table)
+
+        if isinstance(obj, (list, tuple)):
+            offsets = [self.encode(item) for item in obj]
+            table = b"".join(_SIZE.pack(offset) for offset in offsets)
+            return self.emit(_LIST, _SIZE.pack(len(offsets)), table)
+
+        if isinstance(obj, (set, frozenset)):
+            offsets = [self.encode(item) for item in obj]
+            table = b"".join(_SIZE.pack(offset) for offset in offsets)
+            return self.emit(_SET, _SIZE.pack(len(offsets)), table)
+
+        # `datetime` is a subclass of `date`, so it goes first.
+        if isinstance(obj, datetime.datetime):
+            date = _DATE.pack(obj.year, obj.month, obj.day)
+            return self.emit(_DATETIME_TAG, date, _pack_time(obj))
+        if isinstance(obj, datetime.date):
+            return self.emit(_DATE_TAG, _DATE.pack(obj.year, obj.month, obj.day))
+        if isinstance(obj, datetime.time):
+            return self.emit(_TIME_TAG, _pack_time(obj))
+
+        raise TypeError(
+            f"Values of type '{type(obj).__name__}' can't be encoded in a binary "
+            "config."
+        )
+
+
+def dumps(config):
+    """Encode a parsed config. Raises `TypeError` for values it can't encode."""
+
+    encoder = _Encoder()
+    root = encoder.encode(config)
+    _HEADER.pack_into(encoder.buf, 0, MAGIC, VERSION, 0, root)
+    return bytes(encoder.buf)
+
+
+def load(buffer):
+    """
+    Return a read-only view of a config encoded with `dumps`. `buffer` can be
+    any object that supports the buffer protocol, like an `mmap` or the `buf`
+    of a shared memory block. It must stay open while the view is used.
+    """
+
+    buf = memoryview(buffer)
+    if len(buf) < _HEADER.size:
+        raise ValueError("Not a konfik binary config.")
+    magic, version, _, root = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a konfik binary config.")
+    if version != VERSION:
+        raise ValueError(
+            f"Binary config format version {version} isn't supported, "
+            f"expected version {VERSION}."
+        )
+    return _decode(buf, root)
+
+
+def _decode(buf, offset):
+    tag = buf[offset : offset + 1].tobytes()
+    if tag == _STR:
+        (size,) = _SIZE.unpack_from(buf, offset + 1)
+        start = offset + 1 + _SIZE.size
+        return str(buf[start : start + size], "utf-8", "surrogatepass")
+    if tag == _DICT:
+        return MappingView(buf, offset)
+    if tag == _LIST:
+        return ListView(buf, offset)
+    if tag == _INT_TAG:
+        return _INT.unpack_from(buf, offset + 1)[0]
+    if tag == _FLOAT_TAG:
+        return _FLOAT.unpack_from(buf, offset + 1)[0]
+    if tag == _NONE:
+        return None
+    if tag == _TRUE:
+        return True
+    if tag == _FALSE:
+        return False
+    if tag == _BIG_INT:
+        (size,) = _SIZE.unpack_from(buf, offset + 1)
+        start = offset + 1 + _SIZE.size
+        return int(str(buf[start : start + size], "ascii"))
+    if tag == _DATETIME_TAG:
+        date = _DATE.unpack_from(buf, offset + 1)
+        hour, minute, second, microsecond, tz = _unpack_time(
+            buf, offset + 1 + _DATE.size
+        )
+        return datetime.datetime(*date, hour, minute, second, microsecond, tz)
+    if tag == _DATE_TAG:
+        return datetime.date(*_DATE.unpack_from(buf, offset + 1))
+    if tag == _TIME_TAG:
+        return datetime.time(*_unpack_time(buf, offset + 1))
+    if tag == _SET:
+        (count,) = _SIZE.unpack_from(buf, offset + 1)
+        start = offset + 1 + _SIZE.size
+        return frozenset(
+            _decode(buf, _SIZE.unpack_from(buf, start + i * _SIZE.size)[0])
+            for i in range(count)
+        )
+    raise ValueError(f"Corrupt binary config, unknown tag {tag!r} at {offset}.")
+
+
+class MappingView(Mapping):
+    """
+    Read-only DotMap-compatible view of an encoded mapping. Keys are decoded on
+    first access and values are decoded and cached as they're read.
+    """
+
+    __slots__ = ("_buf", "_offset", "_table", "_values")
+
+    def __init__(self, buf, offset):
+        object.__setattr__(self, "_buf", buf)
+        object.__setattr__(self, "_offset", offset)
+        object.__setattr__(self, "_table", None)
+        object.__setattr__(self, "_values", {})
+
+    def _keys(self):
+        table = self._table
+        if table is None:
+            buf = self._buf
+            (count,) = _SIZE.unpack_from(buf, self._offset + 1)
+            start = self._offset + 1 + _SIZE.size
+            table = {}
+            for i in range(count):
+                key, value = _PAIR.unpack_from(buf, start + i * _PAIR.size)
+                table[_decode(buf, key)] = value
+            object.__setattr__(self, "_table", table)
+        return table
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        try:
+            offset = self._keys()[key]
+        except KeyError:
+            raise MissingVariableError(f"No such variable '{key}' exists") from None
+        value = self._values[key] = _decode(self._buf, offset)
+        return value
+
+    def __getattr__(self, name):
+        # Keep dunder lookups, like the ones `copy` and `pickle` make, on the class.
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __setattr__(self, name, value):
+        raise TypeError(f"'{type(self).__name__}' object is read-only.")
+
+    __delattr__ = __setattr__
+
+    def __contains__(self, key):
+        return key in self._keys()
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class ListView(Sequence):
+    """Read-only view of an encoded list. Items are decoded as they're read."""
+
+    __slots__ = ("_buf", "_offset", "_len", "_items")
+
+    def __init__(self, buf, offset):
+        self._buf = buf
+        self._offset = offset
+        (self._len,) = _SIZE.unpack_from(buf, offset + 1)
+        self._items = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("list index out of range")
+
+        try:
+            return self._items[index]
+        except KeyError:
+            pass
+        start = self._offset + 1 + _SIZE.size
+        (offset,) = _SIZE.unpack_from(self._buf, start + index * _SIZE.size)
+        value = self._items[index] = _decode(self._buf, offset)
+        return value
+
+    def __len__(self):
+        return self._len
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def materialize(obj):
+    """Copy a view, and everything under it, into plain dicts and lists."""
+
+    if isinstance(obj, MappingView):
+        return {key: materialize(val) for key, val in obj.items()}
+    if isinstance(obj, ListView):
+        return [materialize(item) for item in obj]
+    return obj
@@ -0,0 +1,113 @@
+"""
+Precompiled configs: `konfik compile config.yaml -o config.kfc`.
+
+A `.kfc` file is a snapshot of a parsed config in the `konfik.binary` format,
+behind a header that records the container version, a checksum of the payload
+and the path, mtime and size of the source file. Loading maps the file and
+reads the config in place, so nothing is parsed and subtrees are only decoded
+when they're accessed.
+
+A snapshot is rejected when it was written by an incompatible version, when its
+checksum doesn't match or when its source file has changed since. A snapshot
+whose source isn't around anymore, like one shipped on its own, is trusted.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+
+from konfik import StaleConfigError, _parse, binary
+
+MAGIC = b"KFC\x00"
+VERSION = 1
+
+# magic, container version, binary format version, payload checksum, source
+# mtime in nanoseconds, source size, length of the source path
+_HEADER = struct.Struct("<4sHH16sQQI")
+
+
+def _checksum(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def compile_config(source, output=None):
+    """
+    Parse `source` and write its compiled snapshot to `output`, which defaults
+    to the source path with a `.kfc` extension. Returns the output path.
+    """
+
+    source = os.path.abspath(str(source))
+    output = str(output) if output else os.path.splitext(source)[0] + ".kfc"
+
+    stat = os.stat(source)
+    _, config = _parse(source)
+    payload = binary.dumps(config)
+    source_bytes = os.fsencode(source)
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        binary.VERSION,
+        _checksum(payload),
+        stat.st_mtime_ns,
+        stat.st_size,
+        len(source_bytes),
+    )
+
+    # Written under a temporary name so that a reader never sees half a file.
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".konfik-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(source_bytes)
+            f.write(payload)
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return output
+
+
+def load_compiled(config_path, check_source=True):
+    """Map a `.kfc` file and return a read-only view of its config."""
+
+    with open(config_path, "rb") as f:
+        try:
+            handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped.
+            handle = b""
+
+    buf = memoryview(handle)
+    if len(buf) < _HEADER.size or buf[:4] != MAGIC:
+        raise ValueError(f"'{config_path}' is not a compiled konfik config.")
+
+    _, version, format_version, checksum, mtime_ns, size, path_size = (
+        _HEADER.unpack_from(buf, 0)
+    )
+    if version != VERSION or format_version != binary.VERSION:
+        raise ValueError(
+            f"'{config_path}' was compiled by an incompatible version of konfik, "
+            "compile it again."
+        )
+
+    start = _HEADER.size + path_size
+    source = os.fsdecode(buf[_HEADER.size : start].tobytes())
+    payload = buf[start:]
+    if _checksum(payload) != checksum:
+        raise ValueError(f"'{config_path}' is corrupt, its checksum doesn't match.")
+
+    if check_source:
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+            raise StaleConfigError(
+                f"'{config_path}' is older than its source '{source}', "
+                "compile it again."
+            )
+
+    return binary.load(payload)
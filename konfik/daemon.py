@@ -0,0 +1,156 @@
+"""
+Answer `konfik --var` and `--show` from a long-running process.
+
+`konfik serve` keeps parsed configs in memory and listens on a Unix socket. The
+CLI sends its query there when the daemon is running and only starts parsing
+itself when it isn't. Configs are held through `Konfik.shared`, so a file is
+parsed again only after its mtime or size changes.
+
+Each connection carries one request, a JSON line with the absolute `path` of
+the config, an optional `var` and the optional `max_depth` and `max_items` of
+the output, and gets one JSON line back. The daemon sends the formatted value
+as `text`, or an `error` that makes the client fall back to handling the query
+itself so that the error is reported as usual.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+
+# A request is a path and a variable name, far below this size.
+_MAX_REQUEST = 64 * 1024
+
+
+def socket_path():
+    """
+    Path of the daemon's socket, from the `KONFIK_SOCKET` environment variable
+    or a per-user default.
+    """
+
+    path = os.environ.get("KONFIK_SOCKET")
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, "getuid") else "user"
+    return os.path.join(directory, f"konfik-{uid}.sock")
+
+
+def format_value(value, max_depth=None, max_items=None):
+    from konfik.pretty import pretty_lines
+
+    return "\n".join(pretty_lines(value, max_depth, max_items))
+
+
+def answer(request):
+    """Look up the value a request asks for and return the reply."""
+
+    from konfik import Konfik, LazyDotMap, compile_path
+
+    try:
+        konfik = Konfik.shared(request["path"], dotmap_cls=LazyDotMap)
+        value = konfik._config_raw
+        if request.get("var"):
+            value = compile_path(request["var"])(value)
+        text = format_value(value, request.get("max_depth"), request.get("max_items"))
+        return {"text": text}
+    except Exception as exc:
+        return {"error": f"{type(exc).__name__}: {exc}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(_MAX_REQUEST)
+        try:
+            request = json.loads(line)
+        except ValueError:
+            reply = {"error": "Malformed request."}
+        else:
+            reply = answer(request)
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Only the user running the daemon may query it.
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+
+def make_server(path=None):
+    """
+    Bind the daemon's socket. A socket file left behind by a daemon that's no
+    longer running is replaced, a running daemon or a file that isn't a socket
+    raises `OSError`.
+    """
+
+    path = path or socket_path()
+    if os.path.exists(path):
+        if query({"path": ""}, path, timeout=1.0) is not None:
+            raise OSError(f"A konfik daemon is already listening on '{path}'.")
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise OSError(f"'{path}' exists and isn't a socket.")
+        os.unlink(path)
+    return Server(path, _Handler)
+
+
+def serve(path=None):
+    """Answer queries until interrupted."""
+
+    server = make_server(path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(server.server_address)
+        except OSError:
+            pass
+
+
+def _is_trusted(path):
+    """
+    Tell if the socket at `path` was created by a daemon of the current user.
+    The default socket may be in a shared directory like /tmp, where another
+    user could create it first and answer queries with values of their own.
+    """
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISSOCK(st.st_mode) or st.st_mode & 0o077:
+        return False
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def query(request, path=None, timeout=5.0):
+    """
+    Send a request to the daemon and return its reply, or `None` when no
+    daemon of the current user is listening.
+    """
+
+    path = path or socket_path()
+    if not _is_trusted(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
@@ -0,0 +1,94 @@
+"""
+Flatten a config, or some of its subtrees, into variables in a single pass.
+
+Formats:
+
+- `shell`: `export DATABASE__SERVER='192.168.1.1'` lines, ready for `eval`.
+- `env`: `DATABASE__SERVER='192.168.1.1'` lines for a `.env` file.
+- `ndjson`: one `{"key": "database.server", "value": "192.168.1.1"}` object per
+  line, keeping the types of the values.
+
+Nested keys are joined with `__` in variable names and with dots in NDJSON keys,
+and list items are keyed by their index.
+"""
+
+import json
+import re
+from collections.abc import Mapping
+
+from konfik import _is_sequence, compile_path, join_path, split_path
+
+FORMATS = ("shell", "env", "ndjson")
+
+_NOT_NAME = re.compile(r"\W")
+
+
+def flatten(obj, keys=()):
+    """Yield the `(keys, value)` pairs of the leaves under `obj`."""
+
+    if isinstance(obj, Mapping):
+        items = obj.items()
+    elif _is_sequence(obj):
+        items = enumerate(obj)
+    else:
+        yield keys, obj
+        return
+
+    for key, val in items:
+        yield from flatten(val, keys + (key,))
+
+
+def _name(keys):
+    name = "__".join(_NOT_NAME.sub("_", str(key)) for key in keys).upper()
+    return f"_{name}" if not name or name[0].isdigit() else name
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _shell_quote(text):
+    return "'" + text.replace("'", "'\"'\"'") + "'"
+
+
+def _env_quote(text):
+    # Single quotes are taken literally by dotenv parsers, but can't hold
+    # themselves or newlines.
+    if "'" not in text and "\n" not in text:
+        return f"'{text}'"
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def export_lines(config, fmt, paths=None):
+    """
+    Yield the lines that export the leaves of `config` in format `fmt`, or only
+    the leaves under the dotted `paths` when they're given.
+    """
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Export format must be one of {', '.join(FORMATS)}.")
+
+    if paths:
+        roots = [
+            (tuple(split_path(path)), compile_path(path)(config)) for path in paths
+        ]
+    else:
+        roots = [((), config)]
+
+    for root_keys, root in roots:
+        for keys, value in flatten(root, root_keys):
+            if fmt == "ndjson":
+                yield json.dumps(
+                    {"key": join_path(keys), "value": value}, default=_text
+                )
+            elif fmt == "shell":
+                yield f"export {_name(keys)}={_shell_quote(_text(value))}"
+            else:
+                yield f"{_name(keys)}={_env_quote(_text(value))}"
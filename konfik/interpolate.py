@@ -0,0 +1,185 @@
+"""
+Resolve `${...}` references in a parsed config.
+
+`${database.host}` is replaced by the value at that dotted path and `${ENV:HOME}`
+by an environment variable. A string that's nothing but a reference takes the
+referenced value as it is, so `${database.port}` stays an int and can point to
+a whole table. References inside longer strings are formatted into them. `$${`
+stands for a literal `${`.
+
+Every node is resolved at most once and referenced paths are looked up in a
+`FlatIndex`, so the cost is linear in the size of the config plus the number of
+references, whatever their depth.
+"""
+
+import os
+import re
+import threading
+from collections.abc import Mapping
+
+from konfik import (
+    DotMap,
+    FlatIndex,
+    InterpolationError,
+    LazyDotMap,
+    MissingVariableError,
+    _is_sequence,
+    split_path,
+)
+
+_REFERENCE = re.compile(r"\$\$\{|\$\{([^}]*)\}")
+
+_MISSING = object()
+
+
+def _child(path, key):
+    """Path of `key` under `path`, escaped the way `FlatIndex` does."""
+
+    key = str(key).replace("\\", "\\\\").replace(".", "\\.")
+    return f"{path}.{key}" if path else key
+
+
+class Resolver:
+    """
+    Resolve the references of one config. Resolved nodes are memoized by path
+    and subtrees without references are returned as they are, not copied.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        self._index = None
+        self._resolved = {}
+        # Paths being resolved, outermost first, to report cycles.
+        self._active = []
+        self._active_set = set()
+
+    def resolve(self, obj, path=""):
+        """Return `obj`, the node at `path`, with its references resolved."""
+
+        if isinstance(obj, str):
+            if "${" not in obj:
+                return obj
+        elif not (isinstance(obj, Mapping) or _is_sequence(obj)):
+            return obj
+
+        try:
+            return self._resolved[path]
+        except KeyError:
+            pass
+
+        if path in self._active_set:
+            chain = self._active[self._active.index(path) :] + [path]
+            raise InterpolationError(f"Circular reference: {' -> '.join(chain)}")
+
+        self._active.append(path)
+        self._active_set.add(path)
+        try:
+            if isinstance(obj, str):
+                value = self._substitute(obj)
+            elif isinstance(obj, Mapping):
+                items = {
+                    key: self.resolve(val, _child(path, key))
+                    for key, val in obj.items()
+                }
+                changed = any(items[key] is not val for key, val in obj.items())
+                value = items if changed else obj
+            else:
+                items = [
+                    self.resolve(val, _child(path, i)) for i, val in enumerate(obj)
+                ]
+                changed = any(new is not old for new, old in zip(items, obj))
+                if changed:
+                    # Read-only views, like those of `konfik.binary`, become lists.
+                    value = type(obj)(items) if isinstance(obj, tuple) else items
+                else:
+                    value = obj
+        finally:
+            self._active.pop()
+            self._active_set.discard(path)
+
+        self._resolved[path] = value
+        return value
+
+    def _substitute(self, string):
+        match = _REFERENCE.fullmatch(string)
+        if match and match.group(1) is not None:
+            return self._lookup(match.group(1))
+
+        def replace(match):
+            if match.group(1) is None:
+                return "${"
+            value = self._lookup(match.group(1))
+            return value if isinstance(value, str) else str(value)
+
+        return _REFERENCE.sub(replace, string)
+
+    def _lookup(self, reference):
+        reference = reference.strip()
+        if reference.startswith("ENV:"):
+            name = reference[4:]
+            try:
+                return os.environ[name]
+            except KeyError:
+                raise MissingVariableError(
+                    f"Environment variable '{name}' is not set."
+                ) from None
+
+        if self._index is None:
+            self._index = FlatIndex(self.config)
+
+        # Rebuild the path so that every spelling of it is memoized once.
+        path = ""
+        for key in split_path(reference):
+            path = _child(path, key)
+
+        target = self._index.get(path, _MISSING)
+        if target is _MISSING:
+            raise MissingVariableError(f"No such variable '{reference}' exists.")
+        return self.resolve(target, path)
+
+
+def resolve(config):
+    """Return `config` with every reference resolved."""
+
+    return Resolver(config).resolve(config)
+
+
+class LazyResolvedDotMap(LazyDotMap):
+    """
+    LazyDotMap that resolves references the first time a value is accessed.
+    Nested mappings are wrapped without being resolved, so only the values
+    that are read, and what they refer to, are ever resolved.
+    """
+
+    def __init__(self, *args, resolver=None, path="", **kwargs):
+        super().__init__(*args, **kwargs)
+        object.__setattr__(self, "_resolver", resolver)
+        object.__setattr__(self, "_path", path)
+
+    def __getitem__(self, key):
+        if self._resolver is None or key in self._converted:
+            return super().__getitem__(key)
+
+        val = DotMap.__getitem__(self, key)
+        path = _child(self._path, key)
+        if isinstance(val, Mapping):
+            val = type(self)(val, resolver=self._resolver, path=path)
+        else:
+            with self._resolver.lock:
+                val = self._convert(self._resolver.resolve(val, path))
+        dict.__setitem__(self, key, val)
+        self._converted.add(key)
+        return val
+
+    __getattr__ = __getitem__
+
+    def __reduce__(self):
+        # The resolver can't be pickled, so the values are resolved first.
+        return LazyDotMap, ({key: self[key] for key in self},)
+
+    @classmethod
+    def from_config(cls, config):
+        """Wrap a parsed config, resolving its references on access."""
+
+        return cls(config, resolver=Resolver(config))
@@ -0,0 +1,145 @@
+"""
+Tell what changed between two configs by hashing their subtrees.
+
+`hash_tree` gives every mapping, list and value of a config a digest computed
+from the digests of its children, Merkle-style. Two subtrees with the same
+digest hold the same data, so `diff` only walks into the subtrees whose digests
+differ and the work follows the size of the change rather than the size of the
+config. Mapping digests don't depend on the order of the keys.
+
+`reuse` builds the new parsed config out of the old one's unchanged subtrees, so
+that `Konfik.reload` can tell them apart by identity and keep their converted
+objects. Code that held on to a part of `konfik.config` that didn't change keeps
+the very object that's in the new config.
+"""
+
+import hashlib
+from collections.abc import Mapping, Set
+
+from konfik import _is_sequence, join_path
+
+_DIGEST_SIZE = 16
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+
+def _leaf_digest(obj):
+    if isinstance(obj, Set):
+        text = "{" + ", ".join(sorted(map(repr, obj))) + "}"
+    else:
+        text = repr(obj)
+    return _digest(
+        type(obj).__qualname__.encode(), b":", text.encode("utf-8", "replace")
+    )
+
+
+class Node:
+    """Digest of a subtree, with the nodes of its children if it has any."""
+
+    __slots__ = ("digest", "children")
+
+    def __init__(self, digest, children=None):
+        self.digest = digest
+        self.children = children
+
+    def __repr__(self):
+        return f"Node({self.digest.hex()})"
+
+
+def hash_tree(obj):
+    """Hash `obj` and each of its subtrees and return the root `Node`."""
+
+    if isinstance(obj, Mapping):
+        children = {key: hash_tree(val) for key, val in obj.items()}
+        pairs = sorted(
+            _leaf_digest(key) + node.digest for key, node in children.items()
+        )
+        return Node(_digest(b"d", *pairs), children)
+
+    if _is_sequence(obj):
+        children = [hash_tree(item) for item in obj]
+        return Node(_digest(b"l", *(node.digest for node in children)), children)
+
+    return Node(_leaf_digest(obj))
+
+
+def _diff(old_node, new_node, keys, changes):
+    if old_node.digest == new_node.digest:
+        return
+
+    old_children, new_children = old_node.children, new_node.children
+    if type(old_children) is not type(new_children) or old_children is None:
+        # A value, or a container that became something else.
+        changes.append(join_path(keys))
+        return
+
+    if isinstance(new_children, dict):
+        for key, node in new_children.items():
+            if key in old_children:
+                _diff(old_children[key], node, keys + (key,), changes)
+            else:
+                changes.append(join_path(keys + (key,)))
+        for key in old_children:
+            if key not in new_children:
+                changes.append(join_path(keys + (key,)))
+        return
+
+    for index in range(max(len(old_children), len(new_children))):
+        if index < len(old_children) and index < len(new_children):
+            _diff(old_children[index], new_children[index], keys + (index,), changes)
+        else:
+            changes.append(join_path(keys + (index,)))
+
+
+def diff(old, new, old_tree=None, new_tree=None):
+    """
+    Return the dotted paths that were added, removed or changed between the
+    configs `old` and `new`, using their hash trees when they're given. Paths
+    are listed as deep as the change goes, list items by their index. A change
+    of the whole config is reported as the empty path.
+    """
+
+    changes = []
+    _diff(old_tree or hash_tree(old), new_tree or hash_tree(new), (), changes)
+    return changes
+
+
+def reuse(old, new, old_tree, new_tree):
+    """
+    Return `new` with each subtree that's unchanged since `old` replaced by the
+    subtree of `old`. Subtrees are only rebuilt along the changed paths.
+    """
+
+    if old_tree.digest == new_tree.digest:
+        return old
+
+    old_children, new_children = old_tree.children, new_tree.children
+    if isinstance(new_children, dict) and isinstance(old_children, dict):
+        if not isinstance(new, dict):
+            return new
+        merged = type(new)()
+        for key, val in new.items():
+            if key in old_children:
+                val = reuse(old[key], val, old_children[key], new_children[key])
+            merged[key] = val
+        return merged
+
+    if isinstance(new_children, list) and isinstance(old_children, list):
+        if not isinstance(new, (list, tuple)):
+            return new
+        items = [
+            (
+                reuse(old[index], item, old_children[index], new_children[index])
+                if index < len(old_children)
+                else item
+            )
+            for index, item in enumerate(new)
+        ]
+        return type(new)(items)
+
+    return new
@@ -0,0 +1,122 @@
+"""
+Pretty-print a config a line at a time, within bounds.
+
+Containers that fit in the width are printed on one line, the others get one
+item per line. Containers deeper than `max_depth` are collapsed into `{...}` or
+`[...]` with a count of their items, and only the first `max_items` items of a
+container are printed, followed by a count of the rest. Whether a container
+fits is decided by rendering it until the width runs out, so the work is
+bounded by the output rather than by the size of the config.
+"""
+
+from collections.abc import Mapping
+
+from konfik import _is_sequence
+
+INDENT = 4
+
+
+def _brackets(obj):
+    if isinstance(obj, Mapping):
+        return "{", "}"
+    if isinstance(obj, tuple):
+        return "(", ")"
+    return "[", "]"
+
+
+def _items(obj):
+    if isinstance(obj, Mapping):
+        return ((f"{key!r}: ", val) for key, val in obj.items())
+    return (("", item) for item in obj)
+
+
+def _is_container(obj):
+    return isinstance(obj, Mapping) or _is_sequence(obj)
+
+
+def _summary(obj):
+    count = len(obj)
+    noun = "key" if isinstance(obj, Mapping) else "item"
+    return f"{count} {noun}{'' if count == 1 else 's'}"
+
+
+class _Printer:
+    def __init__(self, max_depth=None, max_items=None, width=60):
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.width = width
+
+    def collapsed(self, obj, depth):
+        return self.max_depth is not None and depth >= self.max_depth
+
+    def truncated(self, obj):
+        return self.max_items is not None and len(obj) > self.max_items
+
+    def inline(self, obj, budget, depth):
+        """
+        Render `obj` on one line, or return `None` if it doesn't fit in
+        `budget` characters or has to be collapsed or truncated.
+        """
+
+        if not _is_container(obj):
+            # Skip the repr of long strings that can't fit anyway.
+            if isinstance(obj, (str, bytes)) and len(obj) > budget:
+                return None
+            text = repr(obj)
+            return text if len(text) <= budget else None
+
+        if self.collapsed(obj, depth) or self.truncated(obj):
+            return None
+
+        opening, closing = _brackets(obj)
+        parts = []
+        budget -= len(opening) + len(closing)
+        for prefix, val in _items(obj):
+            if parts:
+                budget -= 2
+            budget -= len(prefix)
+            if budget < 0:
+                return None
+            text = self.inline(val, budget, depth + 1)
+            if text is None:
+                return None
+            budget -= len(text)
+            parts.append(prefix + text)
+        if len(parts) == 1 and closing == ")":
+            parts[0] += ","
+        return opening + ", ".join(parts) + closing
+
+    def lines(self, obj, indent=0, prefix="", suffix="", depth=0):
+        pad = " " * indent
+        budget = self.width - indent - len(prefix) - len(suffix)
+        text = self.inline(obj, budget, depth)
+        if text is not None:
+            yield f"{pad}{prefix}{text}{suffix}"
+            return
+        if not _is_container(obj):
+            yield f"{pad}{prefix}{obj!r}{suffix}"
+            return
+
+        opening, closing = _brackets(obj)
+        if self.collapsed(obj, depth):
+            yield f"{pad}{prefix}{opening}...{closing}{suffix}  # {_summary(obj)}"
+            return
+
+        yield f"{pad}{prefix}{opening}"
+        for index, (item_prefix, val) in enumerate(_items(obj)):
+            if self.max_items is not None and index == self.max_items:
+                rest = len(obj) - index
+                yield f"{pad}{' ' * INDENT}...  # {rest} more"
+                break
+            yield from self.lines(val, indent + INDENT, item_prefix, ",", depth + 1)
+        yield f"{pad}{closing}{suffix}"
+
+
+def pretty_lines(obj, max_depth=None, max_items=None, width=60):
+    """
+    Yield the lines of `obj` pretty-printed. Containers nested more than
+    `max_depth` levels deep are collapsed and only `max_items` items of each
+    container are shown.
+    """
+
+    return _Printer(max_depth, max_items, width).lines(obj)
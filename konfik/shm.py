@@ -0,0 +1,134 @@
+"""
+Share a loaded config between processes without copying it into each of them.
+
+A pre-fork server's master process publishes its config once, encoded with
+`konfik.binary`, and the workers attach to it. The encoded config lives in a
+`multiprocessing.shared_memory` block, or in a memory-mapped file on Python
+versions without it or when a `path` is given. Workers read it through
+read-only views, decoding only the values they access.
+"""
+
+import mmap
+import os
+import tempfile
+
+from konfik import binary
+
+
+def _shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:  # Python < 3.8
+        return None
+    return shared_memory
+
+
+def _fallback_path(name):
+    """File that stands in for the shared memory block `name`."""
+
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"konfik-{name}")
+
+
+class Publication:
+    """A published config. Unlink it once no new workers will attach."""
+
+    def __init__(self, name, path, size, block=None):
+        self.name = name
+        self.path = path
+        self.size = size
+        self._block = block
+
+    def close(self):
+        """Release this process's handle on the shared memory block."""
+
+        if self._block is not None:
+            self._block.close()
+
+    def unlink(self):
+        """Remove the published config. Attached processes keep their mapping."""
+
+        if self._block is not None:
+            self._block.unlink()
+        else:
+            os.unlink(self.path)
+
+
+def publish(config, name=None, path=None):
+    """
+    Encode `config` into shared memory and return a `Publication`. The block
+    gets a random name unless `name` is given. With `path`, or when shared
+    memory isn't available, the config is written to a file to be mapped.
+    """
+
+    data = binary.dumps(config)
+    shared_memory = _shared_memory()
+
+    if path is None and shared_memory is not None:
+        block = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        block.buf[: len(data)] = data
+        return Publication(block.name, None, len(data), block)
+
+    if path is None:
+        name = name or f"{os.getpid()}-{os.urandom(4).hex()}"
+        path = _fallback_path(name)
+
+    # Written under a temporary name so that attaching never sees half a file.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".konfik-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return Publication(name, path, len(data))
+
+
+def _attach_block(shared_memory, name):
+    class AttachedBlock(shared_memory.SharedMemory):
+        def close(self):
+            # Views of the config may outlive the block object. The memory is
+            # then unmapped once the last of them is gone.
+            try:
+                super().close()
+            except BufferError:
+                pass
+
+    try:
+        return AttachedBlock(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        pass
+
+    # Attaching through `SharedMemory` registers the block with the resource
+    # tracker, which would unlink it when this process exits. On Linux the block
+    # is a file under /dev/shm that can be mapped without involving the tracker.
+    path = os.path.join("/dev/shm", name.lstrip("/"))
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    from multiprocessing import resource_tracker
+
+    block = AttachedBlock(name=name)
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def attach(name=None, path=None):
+    """
+    Return a read-only view of a config published with `publish`, and the
+    handle that keeps its memory mapped. Pass the publication's `name`, or its
+    `path` if it was published to a file.
+    """
+
+    shared_memory = _shared_memory()
+    if path is None and shared_memory is not None:
+        handle = _attach_block(shared_memory, name)
+        return binary.load(getattr(handle, "buf", handle)), handle
+
+    path = path or _fallback_path(name)
+    with open(path, "rb") as f:
+        handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return binary.load(handle), handle
@@ -0,0 +1,474 @@
+"""
+Extract a single variable from a JSON or YAML config without loading all of it.
+
+The document is read in chunks and walked toward the requested dotted path.
+Siblings on the way are skipped without being parsed, keeping only the nesting
+depth and whether the reader is inside a string, so memory is bounded by the
+size of the answer rather than the size of the file. After the answer, the rest
+of each enclosing mapping is skipped the same way to make sure the key isn't
+repeated, since a full load keeps the last of repeated keys.
+"""
+
+import os
+import re
+
+# Files smaller than this are cheaper to load in full.
+STREAM_MIN_SIZE = 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+# The inside of a string up to its closing quote, or up to a backslash that
+# ends the buffer and escapes a character of the next chunk.
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_NOT_STRUCTURE = re.compile(r'[^"{}\[\]]*')
+_SCALAR_END = re.compile(r"[\s,\]}]")
+_WHITESPACE = re.compile(r"\s*")
+
+
+class _Fallback(Exception):
+    """The document uses a feature that can't be resolved while streaming."""
+
+
+def can_stream(config_path):
+    """Tell if `config_path` is large enough and of a type that can be streamed."""
+
+    from konfik import _BUILTIN_BACKENDS, _backends
+
+    ext = str(config_path).split(".")[-1]
+    if ext not in _EXTRACTORS:
+        return False
+
+    # A user-registered loader might parse the file differently.
+    if _backends.get(ext) is not _BUILTIN_BACKENDS.get(ext):
+        return False
+
+    try:
+        return os.path.getsize(config_path) >= STREAM_MIN_SIZE
+    except OSError:
+        return False
+
+
+def extract(config_path, query):
+    """
+    Return the value at the dotted `query` path in a JSON or YAML config file.
+    Integer path segments index into lists. If the file uses something the
+    streaming parser can't resolve on its own, like a YAML alias to an anchor
+    outside the requested subtree, the whole file is loaded instead.
+    """
+
+    from konfik import Konfik, MissingConfigError, compile_path, split_path
+
+    config_path = str(config_path)
+    ext = config_path.split(".")[-1]
+    keys = split_path(query)
+
+    try:
+        return _EXTRACTORS[ext](config_path, keys)
+    except FileNotFoundError:
+        raise MissingConfigError(f"{ext.upper()} file not found.") from None
+    except _Fallback:
+        return compile_path(query)(Konfik(config_path)._config_raw)
+
+
+def _missing(key):
+    from konfik import MissingVariableError
+
+    return MissingVariableError(f"No such variable '{key}' exists.")
+
+
+class _JSONReader:
+    """Chunked JSON reader that can skip values without decoding them."""
+
+    def __init__(self, f, chunk_size=None):
+        self.f = f
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        # Start of the value being captured in `buf`, and the parts of it that
+        # earlier chunks held. They're joined once the value is complete.
+        self.mark = None
+        self.captured = []
+
+    def fill(self):
+        """Read the next chunk. Returns False at the end of the file."""
+
+        if self.eof:
+            return False
+
+        if self.mark is not None:
+            self.captured.append(self.buf[self.mark : self.pos])
+            self.mark = 0
+        self.buf = self.buf[self.pos :]
+        self.pos = 0
+
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON document.")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON document.")
+        self.pos += 1
+
+    def skip_string(self):
+        # The opening quote is at `self.pos`.
+        self.pos += 1
+        self.skip_string_body()
+
+    def skip_string_body(self):
+        """Move past the closing quote of the string the reader is inside."""
+
+        while True:
+            self.pos = _STRING_BODY.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) and self.buf[self.pos] == '"':
+                self.pos += 1
+                return
+            # The string goes on in the next chunk. What's been scanned is
+            # dropped, unless it's part of a value being captured.
+            if not self.fill():
+                raise ValueError("Unterminated JSON string.")
+
+    def skip_value(self):
+        """Move past the value starting at the current position."""
+
+        char = self.peek()
+        if char == '"':
+            self.skip_string()
+        elif char in "{[":
+            depth = 0
+            while True:
+                self.pos = _NOT_STRUCTURE.match(self.buf, self.pos).end()
+                if self.pos == len(self.buf):
+                    if not self.fill():
+                        raise ValueError("Unexpected end of JSON document.")
+                    continue
+
+                char = self.buf[self.pos]
+                self.pos += 1
+                if char == '"':
+                    self.skip_string_body()
+                    continue
+                depth += 1 if char in "{[" else -1
+                if depth == 0:
+                    return
+        else:
+            while True:
+                match = _SCALAR_END.search(self.buf, self.pos)
+                if match is not None:
+                    self.pos = match.start()
+                    return
+                self.pos = len(self.buf)
+                if not self.fill():
+                    return
+
+    def read_value(self):
+        """Decode the value starting at the current position."""
+
+        import json
+
+        self.peek()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.captured_text())
+        finally:
+            self.mark = None
+            self.captured = []
+
+    def captured_text(self):
+        """Return the text from `mark` to the current position."""
+
+        self.captured.append(self.buf[self.mark : self.pos])
+        text = "".join(self.captured)
+        self.captured = []
+        self.mark = self.pos
+        return text
+
+    def find_key(self, key):
+        """Move to the value of `key` in the object at the current position."""
+
+        self.expect("{")
+        if self.peek() == "}":
+            raise _missing(key)
+
+        while True:
+            if self.read_key() == key:
+                return
+            self.skip_value()
+            if self.peek() == "}":
+                raise _missing(key)
+            self.expect(",")
+
+    def read_key(self):
+        import json
+
+        if self.peek() != '"':
+            raise ValueError("Expected a string key.")
+
+        self.mark = self.pos
+        try:
+            self.skip_string()
+            raw = self.captured_text()[1:-1]
+        finally:
+            self.mark = None
+            self.captured = []
+
+        # Only keys with escapes need decoding.
+        name = json.loads(f'"{raw}"') if "\\" in raw else raw
+        self.expect(":")
+        self.peek()
+        return name
+
+    def find_index(self, key):
+        """Move to the item at index `key` of the array at the current position."""
+
+        try:
+            index = int(key)
+        except ValueError:
+            raise _missing(key) from None
+
+        if index < 0:
+            # Counting from the end needs the length of the array.
+            raise _Fallback
+
+        self.expect("[")
+        if self.peek() == "]":
+            raise _missing(key)
+
+        for _ in range(index):
+            self.skip_value()
+            if self.peek() == "]":
+                raise _missing(key)
+            self.expect(",")
+        self.peek()
+
+    def check_rest(self, char, key):
+        """
+        Move past the rest of the container at the current position, which
+        opened with `char`. Falls back to a full load if an object repeats
+        `key`, because the last occurrence is the one that counts.
+        """
+
+        closing = "}" if char == "{" else "]"
+        while self.peek() != closing:
+            self.expect(",")
+            if char == "{" and self.read_key() == key:
+                raise _Fallback
+            self.skip_value()
+        self.pos += 1
+
+
+def _extract_json(config_path, keys):
+    """Stream `keys` out of a JSON document."""
+
+    with open(config_path, encoding="utf-8") as f:
+        reader = _JSONReader(f)
+        path = []
+        for key in keys:
+            char = reader.peek()
+            if char == "{":
+                reader.find_key(key)
+            elif char == "[":
+                reader.find_index(key)
+            else:
+                raise _missing(key)
+            path.append((char, key))
+
+        value = reader.read_value()
+        for char, key in reversed(path):
+            reader.check_rest(char, key)
+        return value
+
+
+def _skip_yaml_node(events, event):
+    """Consume the events of the node that starts with `event`."""
+
+    import yaml
+
+    depth = 0
+    while True:
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return
+        event = next(events)
+
+
+def _collect_yaml_node(events, event):
+    """Return the events of the node that starts with `event`."""
+
+    import yaml
+
+    collected = [event]
+    depth = 0
+    while True:
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return collected
+        event = next(events)
+        collected.append(event)
+
+
+def _construct_yaml(node_events):
+    """Build Python objects from the events of a single node."""
+
+    from collections import deque
+
+    import yaml
+    from yaml.composer import Composer
+    from yaml.constructor import SafeConstructor
+    from yaml.resolver import Resolver
+
+    class EventLoader(Composer, SafeConstructor, Resolver):
+        """Safe loader that composes from a list of events instead of a stream."""
+
+        def __init__(self, events):
+            self.events = deque(events)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+        def check_event(self, *choices):
+            return not choices or isinstance(self.events[0], choices)
+
+        def peek_event(self):
+            return self.events[0]
+
+        def get_event(self):
+            return self.events.popleft()
+
+    events = [yaml.StreamStartEvent(), yaml.DocumentStartEvent()]
+    events += node_events
+    events += [yaml.DocumentEndEvent(), yaml.StreamEndEvent()]
+    try:
+        return EventLoader(events).get_single_data()
+    except yaml.composer.ComposerError:
+        # An alias to an anchor outside of the node.
+        raise _Fallback from None
+
+
+def _yaml_key(resolver, event):
+    """Return the key a scalar event stands for if it's a plain string."""
+
+    import yaml
+
+    if not isinstance(event, yaml.ScalarEvent):
+        return None
+
+    if event.tag and event.tag != "!":
+        tag = event.tag
+    else:
+        tag = resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+
+    if tag == "tag:yaml.org,2002:merge":
+        # The key might come from the merged mapping.
+        raise _Fallback
+    return event.value if tag == "tag:yaml.org,2002:str" else None
+
+
+def _check_yaml_rest(resolver, events, is_mapping, key):
+    """
+    Consume the rest of the mapping or sequence being read. Falls back to a
+    full load if a mapping repeats `key`, because the last occurrence counts.
+    """
+
+    import yaml
+
+    while True:
+        event = next(events)
+        if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            return
+        if is_mapping:
+            if isinstance(event, yaml.AliasEvent) or _yaml_key(resolver, event) == key:
+                raise _Fallback
+            _skip_yaml_node(events, event)
+            event = next(events)
+        _skip_yaml_node(events, event)
+
+
+def _extract_yaml(config_path, keys):
+    """Stream `keys` out of a YAML document using the parser's event stream."""
+
+    import yaml
+    from yaml.resolver import Resolver
+
+    from konfik import _yaml_loader
+
+    resolver = Resolver()
+    with open(config_path) as f:
+        events = yaml.parse(f, Loader=_yaml_loader())
+        event = next(events)
+        while not isinstance(event, yaml.DocumentStartEvent):
+            event = next(events)
+        event = next(events)
+
+        path = []
+        for key in keys:
+            if isinstance(event, yaml.AliasEvent):
+                raise _Fallback
+
+            path.append((isinstance(event, yaml.MappingStartEvent), key))
+            if isinstance(event, yaml.MappingStartEvent):
+                while True:
+                    event = next(events)
+                    if isinstance(event, yaml.MappingEndEvent):
+                        raise _missing(key)
+                    if isinstance(event, yaml.AliasEvent):
+                        raise _Fallback
+
+                    found = _yaml_key(resolver, event) == key
+                    _skip_yaml_node(events, event)
+                    event = next(events)
+                    if found:
+                        break
+                    _skip_yaml_node(events, event)
+
+            elif isinstance(event, yaml.SequenceStartEvent):
+                try:
+                    index = int(key)
+                except ValueError:
+                    raise _missing(key) from None
+                if index < 0:
+                    # Counting from the end needs the length of the sequence.
+                    raise _Fallback
+
+                for i in range(index + 1):
+                    event = next(events)
+                    if isinstance(event, yaml.SequenceEndEvent):
+                        raise _missing(key)
+                    if i < index:
+                        _skip_yaml_node(events, event)
+
+            else:
+                raise _missing(key)
+
+        node_events = _collect_yaml_node(events, event)
+        for is_mapping, key in reversed(path):
+            _check_yaml_rest(resolver, events, is_mapping, key)
+        return _construct_yaml(node_events)
+
+
+_EXTRACTORS = {
+    "json": _extract_json,
+    "yaml": _extract_yaml,
+    "yml": _extract_yaml,
+}
@@ -0,0 +1,271 @@
+"""
+Typed config classes with `__slots__`, derived from a sample config or a schema.
+
+Each mapping in the config becomes a class with one slot per key, so attribute
+access is a native slot lookup and a node costs no more than its values. The
+root class can be passed to `Konfik` as `dotmap_cls`:
+
+    Config = derive(Konfik("config.toml").config)
+    konfik = Konfik("config.toml", dotmap_cls=Config)
+
+Loading checks the shape of the config, so unknown and missing keys are
+reported when the config is loaded instead of when it's read. `generate_source`
+turns the derived classes into a module that can be checked in.
+"""
+
+import keyword
+import re
+from collections.abc import Mapping
+
+from konfik import MissingVariableError, UnknownVariableError
+
+_NOT_IDENTIFIER = re.compile(r"\W")
+
+
+class SlotConfig(Mapping):
+    """
+    Base class of the derived config classes. `_fields` maps each attribute
+    name to its key in the config and the kind of its value, which is either
+    `None` for values kept as they are, a `SlotConfig` subclass for mappings or
+    a one-item list holding the subclass for lists of mappings. Keys listed in
+    `_optional` default to `None`.
+    """
+
+    __slots__ = ()
+    _fields = {}
+    _optional = frozenset()
+    _attrs = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Attribute names by config key.
+        cls._attrs = {key: attr for attr, (key, _) in cls._fields.items()}
+
+    def __init__(self, data, path=""):
+        if not isinstance(data, Mapping):
+            raise TypeError(
+                f"Expected a mapping at '{path or '<root>'}', "
+                f"got {type(data).__name__}."
+            )
+
+        for key in data:
+            if key not in self._attrs:
+                raise UnknownVariableError(
+                    f"Unknown variable '{_join(path, key)}' for {type(self).__name__}."
+                )
+
+        for attr, (key, kind) in self._fields.items():
+            # DotMaps raise their own error for missing keys, so check first.
+            if key in data:
+                value = data[key]
+            elif key in self._optional:
+                value = None
+            else:
+                raise MissingVariableError(
+                    f"No such variable '{_join(path, key)}' exists."
+                )
+            object.__setattr__(self, attr, _build(kind, value, _join(path, key)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only.")
+
+    def __getitem__(self, key):
+        attr = self._attrs.get(key)
+        if attr is None:
+            raise KeyError(key)
+        return getattr(self, attr)
+
+    def __iter__(self):
+        return (key for key, _ in self._fields.values())
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        fields = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+# Names of `SlotConfig` and `Mapping` members, like `items` or `_fields`, that a
+# slot would shadow or clash with.
+_RESERVED = frozenset(dir(SlotConfig))
+
+
+def _join(path, key):
+    return f"{path}.{key}" if path else str(key)
+
+
+def _build(kind, value, path):
+    if kind is None or value is None:
+        return value
+    if isinstance(kind, list):
+        if not isinstance(value, list):
+            raise TypeError(f"Expected a list at '{path}', got {type(value).__name__}.")
+        return [kind[0](item, _join(path, i)) for i, item in enumerate(value)]
+    return kind(value, path)
+
+
+def _attr_name(key):
+    """
+    Turn a config key into a valid attribute name. Keywords and the names of
+    class members get a trailing underscore.
+    """
+
+    name = _NOT_IDENTIFIER.sub("_", str(key))
+    if not name or name[0].isdigit():
+        name = f"_{name}"
+    while keyword.iskeyword(name) or name in _RESERVED:
+        name = f"{name}_"
+    return name
+
+
+def _class_name(key):
+    return "".join(part.capitalize() for part in _attr_name(key).split("_")) or "Node"
+
+
+class _Builder:
+    """Create the classes of one config, keeping their names unique."""
+
+    def __init__(self):
+        self.names = set()
+
+    def make_class(self, name, parent, fields, optional=()):
+        if name in self.names:
+            name = f"{parent}{name}"
+        base, i = name, 2
+        while name in self.names:
+            name, i = f"{base}{i}", i + 1
+        self.names.add(name)
+
+        attrs = {}
+        for key in fields:
+            attr = _attr_name(key)
+            while attr in attrs.values():
+                attr = f"{attr}_"
+            attrs[key] = attr
+
+        namespace = {
+            "__slots__": tuple(attrs.values()),
+            "_fields": {attrs[key]: (key, kind) for key, kind in fields.items()},
+            "_optional": frozenset(optional),
+        }
+        # `type(SlotConfig)` is `ABCMeta`, the metaclass of `Mapping`.
+        return type(SlotConfig)(name, (SlotConfig,), namespace)
+
+    def from_sample(self, sample, name, parent=""):
+        fields = {
+            key: self.sample_kind(value, _class_name(key), name)
+            for key, value in sample.items()
+        }
+        return self.make_class(name, parent, fields)
+
+    def sample_kind(self, value, name, parent):
+        if isinstance(value, Mapping):
+            return self.from_sample(value, name, parent)
+
+        items = value if isinstance(value, list) else ()
+        if items and all(isinstance(item, Mapping) for item in items):
+            # Keys that only some of the items have are optional.
+            merged, counts = {}, {}
+            for item in items:
+                for key, val in item.items():
+                    merged.setdefault(key, val)
+                    counts[key] = counts.get(key, 0) + 1
+            optional = {key for key, count in counts.items() if count < len(items)}
+            fields = {
+                key: self.sample_kind(val, _class_name(key), name)
+                for key, val in merged.items()
+            }
+            return [self.make_class(name, parent, fields, optional)]
+        return None
+
+    def from_schema(self, schema, name, parent=""):
+        properties = schema.get("properties", {})
+        required = set(schema.get("required", properties))
+        fields = {
+            key: self.schema_kind(prop, _class_name(key), name)
+            for key, prop in properties.items()
+        }
+        return self.make_class(name, parent, fields, set(properties) - required)
+
+    def schema_kind(self, schema, name, parent):
+        if schema.get("type") == "object" and "properties" in schema:
+            return self.from_schema(schema, name, parent)
+        items = schema.get("items")
+        if schema.get("type") == "array" and isinstance(items, Mapping):
+            kind = self.schema_kind(items, name, parent)
+            # Only lists of mappings are typed.
+            return [kind] if isinstance(kind, type) else None
+        return None
+
+
+def derive(sample, name="Config"):
+    """
+    Derive typed classes from a sample config and return the root class. Lists
+    of mappings become lists of one class, where keys missing from some of the
+    items are optional.
+    """
+
+    return _Builder().from_sample(sample, name)
+
+
+def from_schema(schema, name="Config"):
+    """
+    Derive typed classes from a JSON Schema and return the root class. Objects
+    with `properties` become classes and properties left out of `required` are
+    optional. When `required` isn't given, every property is required.
+    """
+
+    return _Builder().from_schema(schema, name)
+
+
+def _classes(root):
+    """Return the classes reachable from `root`, dependencies first."""
+
+    ordered, seen = [], set()
+
+    def visit(cls):
+        if cls in seen:
+            return
+        seen.add(cls)
+        for _, kind in cls._fields.values():
+            if isinstance(kind, list):
+                kind = kind[0]
+            if kind is not None:
+                visit(kind)
+        ordered.append(cls)
+
+    visit(root)
+    return ordered
+
+
+def generate_source(root):
+    """Return the source of a Python module that defines `root` and its children."""
+
+    lines = [
+        '"""Config classes generated by konfik."""',
+        "",
+        "from konfik.typed import SlotConfig",
+    ]
+    for cls in _classes(root):
+        fields = []
+        for attr, (key, kind) in cls._fields.items():
+            if isinstance(kind, list):
+                kind_src = f"[{kind[0].__name__}]"
+            else:
+                kind_src = kind.__name__ if kind is not None else "None"
+            fields.append(f"        {attr!r}: ({key!r}, {kind_src}),")
+
+        lines += ["", "", f"class {cls.__name__}(SlotConfig):"]
+        lines.append(f"    __slots__ = {tuple(cls._fields)!r}")
+        if fields:
+            lines += ["    _fields = {"] + fields + ["    }"]
+        else:
+            lines.append("    _fields = {}")
+        if cls._optional:
+            lines.append(f"    _optional = frozenset({sorted(cls._optional)!r})")
+
+    return "\n".join(lines) + "\n"
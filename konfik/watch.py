@@ -0,0 +1,223 @@
+"""Reload a Konfik config when its file changes."""
+
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify event masks, see inotify(7).
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Detect changes to a file by polling its mtime, size and inode."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._closed = threading.Event()
+        self._signature = self._stat()
+
+    def changed(self, timeout):
+        """Wait up to `timeout` seconds and tell if the file has changed."""
+
+        if self._closed.wait(timeout):
+            return False
+
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+    def wake(self):
+        """Make a blocked `changed` call return."""
+
+        self._closed.set()
+
+    def close(self):
+        self._closed.set()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class InotifyWatcher:
+    """
+    Detect changes to a file through Linux's inotify.
+
+    The parent directory is watched instead of the file itself, because editors
+    often save by writing a new file and renaming it over the old one, which
+    would silently end a watch on the original inode.
+    """
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux.")
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.path = str(path)
+        self._name = os.fsencode(os.path.basename(self.path))
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        directory = os.fsencode(os.path.dirname(os.path.abspath(self.path)))
+        # A file is complete once it's closed after writing or renamed into place.
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, directory, mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+        # Writing to this pipe wakes up a blocked `changed` call.
+        self._wake_r, self._wake_w = os.pipe()
+
+    def changed(self, timeout):
+        """Wait up to `timeout` seconds and tell if the file has changed."""
+
+        ready, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+        if self._fd not in ready or self._wake_r in ready:
+            return False
+
+        changed = False
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(buf):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if name == self._name:
+                    changed = True
+
+    def wake(self):
+        """Make a blocked `changed` call return."""
+
+        os.write(self._wake_w, b"\0")
+
+    def close(self):
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def make_watcher(path, use_inotify=None):
+    """
+    Return an inotify watcher on Linux and a polling watcher elsewhere. With
+    `use_inotify=False` polling is always used.
+    """
+
+    if use_inotify is not False:
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError):
+            # Not Linux, or a libc without inotify.
+            if use_inotify:
+                raise
+    return PollingWatcher(path)
+
+
+class Reloader(threading.Thread):
+    """
+    Background thread that reloads a Konfik instance when its file changes.
+
+    `on_reload(konfik, stats)` is called after each successful reload and
+    `on_error(konfik, exc, stats)` after each failed one. `stats` holds the
+    reload latency measured from the file's mtime, the parse time, the
+    running reload and failure counts and the dotted paths that changed in the
+    last reload.
+    """
+
+    def __init__(
+        self,
+        konfik,
+        interval=1.0,
+        on_reload=None,
+        on_error=None,
+        use_inotify=None,
+    ):
+        super().__init__(name=f"konfik-reloader:{konfik._config_path}", daemon=True)
+        self.konfik = konfik
+        self.interval = interval
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.reloads = 0
+        self.failures = 0
+        self.watcher = make_watcher(konfik._config_path, use_inotify)
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                if self.watcher.changed(self.interval) and not self._stopped.is_set():
+                    self.reload()
+        finally:
+            self.watcher.close()
+
+    def reload(self):
+        """Reload the config now and report the outcome through the hooks."""
+
+        started = time.perf_counter()
+        try:
+            self.konfik.reload()
+        except Exception as exc:
+            # The last good config stays in place.
+            self.failures += 1
+            if self.on_error is not None:
+                self.on_error(self.konfik, exc, self._stats(started))
+            return
+
+        self.reloads += 1
+        if self.on_reload is not None:
+            self.on_reload(self.konfik, self._stats(started))
+
+    def stop(self):
+        """Stop watching the file and wait for the thread to finish."""
+
+        self._stopped.set()
+        if not self.is_alive():
+            self.watcher.close()
+            return
+
+        self.watcher.wake()
+        if threading.current_thread() is not self:
+            self.join()
+
+    def _stats(self, started):
+        parse_time = time.perf_counter() - started
+        try:
+            latency = time.time() - os.stat(self.konfik._config_path).st_mtime
+        except OSError:
+            latency = None
+
+        return {
+            "path": str(self.konfik._config_path),
+            "latency": latency,
+            "parse_time": parse_time,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "changes": self.konfik.changes,
+        }
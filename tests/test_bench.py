@@ -0,0 +1,55 @@
+import json
+
+from benchmarks import bench
+
+
+def test_bench(tmp_path, capsys, monkeypatch):
+    """Smoke test the benchmark suite and the regression check."""
+
+    output = tmp_path / "results.json"
+    argv = [
+        "--formats=json,yaml",
+        "--sizes=1KB",
+        "--repeat=1",
+        "--accesses=10",
+        "--no-cli",
+        f"--output={output}",
+    ]
+    assert bench.main(argv) == 0
+
+    report = json.loads(output.read_text())
+    results = report["results"]
+    assert report["meta"]["python"]
+    for shape in bench.SHAPES:
+        for step in ["parse", "convert", "load", "attribute_access", "get"]:
+            assert results[f"json/{shape}/1KB/{step}"] >= 0
+            assert results[f"yaml/{shape}/1KB/{step}"] >= 0
+
+    # Every timing regressed against a much faster baseline.
+    monkeypatch.setattr(bench, "NOISE_FLOOR", 0)
+    fast = {name: seconds / 1000 for name, seconds in results.items()}
+    regressions = bench.compare(results, fast, threshold=0.2, log=lambda line: None)
+    assert regressions == sorted(results)
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": fast}))
+    assert bench.main(argv + [f"--compare={baseline}"]) == 1
+
+    capsys.readouterr()
+    assert bench.compare(results, results, threshold=0.2) == []
+    assert "REGRESSED" not in capsys.readouterr().out
+
+
+def test_bench_config_shapes():
+    """Test that the generated configs have the requested size and shape."""
+
+    for shape in bench.SHAPES:
+        config, count = bench.make_config(shape, 100 << 10)
+        size = len(json.dumps(config))
+        assert 50 << 10 < size < 150 << 10
+
+        keys = bench.access_path("json", shape, count)
+        obj = config
+        for key in keys:
+            obj = obj[key]
+        assert obj is not None
@@ -1,23 +1,50 @@
+import contextlib
+import copy
+import io
+import os
+import pickle
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, reduce
+from pathlib import Path
+
 import pytest
 
+import konfik as konfik_module
+import konfik.stream as konfik_stream
 from konfik import (
     Colorize,
     DotMap,
+    FlatIndex,
+    FrozenDotMap,
+    InterpolationError,
     Konfik,
+    LazyDotMap,
     MissingConfigError,
     MissingVariableError,
+    ParseCache,
+    StaleConfigError,
+    UnknownVariableError,
     __version__,
     cli_entrypoint,
+    compile_path,
+    register_loader,
+    register_stats_hook,
+    split_path,
 )
 
 
 def test_colorize(config_dict, capsys):
-    colorize = Colorize()
+    colorize = Colorize(color=True)
 
     colorize.colorize_entity(config_dict)
     out, err = capsys.readouterr()
     assert err == ""
-    assert "{\x1b[33m'\x1b[39;49;00m\x1b[33mclients\x1b[39;49;00m\x1b[33m" in out
+    assert "    \x1b[33m'\x1b[39;49;00m\x1b[33mclients\x1b[39;49;00m\x1b[33m" in out
 
     colorize.colorize_title("Hello from the other side!")
     out, err = capsys.readouterr()
@@ -25,6 +52,88 @@ def test_colorize(config_dict, capsys):
     assert "Hello from the" in out
 
 
+def test_colorize_plain(config_dict, tmp_path, capsys, monkeypatch):
+    colorize = Colorize()
+    assert colorize.use_color(sys.stdout) is False
+
+    colorize.colorize_entity(config_dict)
+    out, err = capsys.readouterr()
+    assert "\x1b[" not in out
+    assert "'clients': {'data': [['gamma', 'delta'], [1, 2]]}" in out
+
+    colorize.colorize_title("Hello from the other side!")
+    out, err = capsys.readouterr()
+    assert out == "Hello from the other side!\n"
+
+    # Literals are copied as they are, and highlighted in line-aligned chunks.
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("".join(f"key_{i}: value {i}\n" for i in range(100)))
+    colorize.colorize_file(config_path, "yaml")
+    out, err = capsys.readouterr()
+    assert out == config_path.read_text()
+
+    colorize = Colorize(color=True)
+    colorize.chunk_size = 64
+    colorize.colorize_file(config_path, "yaml")
+    out, err = capsys.readouterr()
+    assert "\x1b[" in out
+    assert re.sub(r"\x1b\[[\d;]*m", "", out) == config_path.read_text()
+
+    # A stdout without a byte buffer gets whole characters across chunks.
+    config_path.write_text("name: Žluťoučký kůň\n", encoding="utf-8")
+    colorize = Colorize()
+    colorize.chunk_size = 7
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        colorize.colorize_file(config_path, "yaml")
+    assert out.getvalue() == "name: Žluťoučký kůň\n"
+
+    monkeypatch.setenv("NO_COLOR", "1")
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+    assert Colorize().use_color(sys.stdout) is False
+    monkeypatch.delenv("NO_COLOR")
+    assert Colorize().use_color(sys.stdout) is True
+
+
+def test_pretty_lines(config_dict):
+    from konfik.pretty import pretty_lines
+
+    lines = list(pretty_lines(config_dict))
+    assert lines[0] == "{"
+    assert "    'clients': {'data': [['gamma', 'delta'], [1, 2]]}," in lines
+    assert lines[-1] == "}"
+    assert eval("\n".join(lines)) == config_dict
+
+    # Deep containers are collapsed, long ones are cut.
+    lines = list(pretty_lines(config_dict, max_depth=1, max_items=2))
+    assert lines == [
+        "{",
+        "    'title': 'TOML Example',",
+        "    'owner': {...},  # 2 keys",
+        "    ...  # 3 more",
+        "}",
+    ]
+
+    # Only the printed items are looked at.
+    class Huge(list):
+        def __iter__(self):
+            return iter(range(len(self)))
+
+        def __len__(self):
+            return 10**12
+
+    lines = list(pretty_lines({"huge": Huge(), "one": (1,)}, max_items=2))
+    assert lines == [
+        "{",
+        "    'huge': [",
+        "        0,",
+        "        1,",
+        "        ...  # 999999999998 more",
+        "    ],",
+        "    'one': (1,),",
+        "}",
+    ]
+
+
 def make_config_path(tmp_path, config_str, config_ext):
     # Making a temporary directory to hold the config file.
     # https://docs.pytest.org/en/stable/tmpdir.html#the-tmp-path-fixture
@@ -408,6 +517,18 @@ def test_konfik_cli_show(capsys):
     assert "TOML Example" in capture.out
 
 
+def test_konfik_cli_show_bounded(capsys, monkeypatch):
+    monkeypatch.setenv("KONFIK_NO_DAEMON", "1")
+    cli_entrypoint(
+        argv=["--path=examples/config.toml", "--show", "--max-depth=1", "--max-items=2"]
+    )
+    capture = capsys.readouterr()
+    assert capture.err == ""
+    assert "'owner': {...},  # 2 keys" in capture.out
+    assert "...  # 3 more" in capture.out
+    assert "192.168.1.1" not in capture.out
+
+
 def test_konfik_cli_show_literal(capsys):
     """Test the CLI help message."""
 
@@ -425,4 +546,1362 @@ def test_konfik_cli_show_var(capsys):
     capture = capsys.readouterr()
     assert capture.err == ""
     assert "Konfik -- The strangely familiar config parser ⚙️" in capture.out
-    assert "tzinfo=<toml.tz.TomlTz" in capture.out
+    assert "datetime.datetime(" in capture.out
+    assert "tzinfo=" in capture.out
+
+
+def test_lazy_dotmap(config_dict, tmp_path, toml_str):
+    """Test the LazyDotMap class."""
+
+    d = LazyDotMap(config_dict)
+
+    # Nothing is converted upfront.
+    assert type(dict.__getitem__(d, "database")) is dict
+
+    # Nested dicts are wrapped on first access and the result is cached.
+    assert isinstance(d.database, LazyDotMap) is True
+    assert d.database is d.database
+    assert isinstance(dict.__getitem__(d, "database"), LazyDotMap) is True
+    assert d.servers.alpha.ip == "10.0.0.1"
+    assert d == config_dict
+
+    # Containers are wrapped one level at a time.
+    m = LazyDotMap({"i": {"j": [{"1": 1}, [{"2": 2}]], "k": ({1: 1},)}})
+    assert isinstance(m.i.j[0], LazyDotMap) is True
+    assert isinstance(m.i.j[1][0], LazyDotMap) is True
+    assert isinstance(m.i.k[0], LazyDotMap) is True
+
+    # Mutating a cached container sticks.
+    d.database.ports.append(8003)
+    assert d.database.ports == [8001, 8001, 8002, 8003]
+
+    # Assignment, deletion and the dict views go through the same path.
+    d.owner = {"name": "Redowan Delowar"}
+    assert d.owner.name == "Redowan Delowar"
+    assert isinstance(d.get("owner"), LazyDotMap) is True
+    assert d.get("fakekey", 1) == 1
+    assert all(isinstance(v, LazyDotMap) for v in d.servers.values())
+    assert all(isinstance(v, LazyDotMap) for _, v in d.servers.items())
+
+    del d.title
+    with pytest.raises(MissingVariableError):
+        d.title
+
+    # So do the dict methods that write, also after a key was converted.
+    d.update({"owner": {"name": "Tom"}}, extra={"a": 1})
+    assert isinstance(d.owner, LazyDotMap) is True
+    assert d.owner.name == "Tom"
+    assert d.extra.a == 1
+    assert d.setdefault("owner", {}).name == "Tom"
+    assert d.setdefault("more", {"b": 2}).b == 2
+    assert isinstance(d.pop("more"), LazyDotMap) is True
+    assert d.pop("more", None) is None
+    d.owner = {"name": "Redowan Delowar"}
+    assert isinstance(d.popitem()[1], LazyDotMap) is True
+    m.clear()
+    m["i"] = {"j": 1}
+    assert m.i.j == 1
+
+    # The raw config is left untouched.
+    assert type(config_dict["database"]) is dict
+    assert config_dict["database"]["ports"] == [8001, 8001, 8002]
+
+    # LazyDotMap can be passed to Konfik.
+    test_toml_path = make_config_path(tmp_path, toml_str, "toml")
+    konfik = Konfik(config_path=test_toml_path, dotmap_cls=LazyDotMap)
+    assert isinstance(konfik.config, LazyDotMap) is True
+    assert konfik.config.servers.beta.dc == "eqdc10"
+
+    # It survives a round trip through pickle, converted or not.
+    config = pickle.loads(pickle.dumps(konfik.config))
+    assert type(config) is LazyDotMap
+    assert config == konfik.config
+    assert config.servers.beta.dc == "eqdc10"
+
+
+# Import time budget for `import konfik` in microseconds. It has to cover
+# compiling the module when there's no bytecode cache.
+IMPORT_TIME_BUDGET_US = 100_000
+
+
+def test_import_time():
+    """Test that importing konfik doesn't pull in the CLI or format backends."""
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import konfik"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=Path(__file__).parent.parent,
+        check=True,
+    )
+
+    # Each line looks like: `import time: self [us] | cumulative | imported package`.
+    timings = {}
+    for line in proc.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        timings[name.strip()] = int(cumulative)
+
+    heavy = {"argparse", "dotenv", "json", "pkg_resources", "pygments", "toml", "yaml"}
+    assert heavy.isdisjoint(name.split(".")[0] for name in timings)
+    assert timings["konfik"] < IMPORT_TIME_BUDGET_US
+
+    # Nothing is colorized until something is printed.
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, konfik; print(sys.excepthook is sys.__excepthook__)",
+        ],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=Path(__file__).parent.parent,
+        check=True,
+    )
+    assert proc.stdout.strip() == "True"
+
+
+def test_konfik_yaml_loader(tmp_path, yaml_str, monkeypatch):
+    """Test that the libyaml and pure-Python YAML loaders give the same result."""
+
+    import yaml
+
+    if not yaml.__with_libyaml__:
+        pytest.skip("PyYAML was built without libyaml support.")
+
+    test_yaml_path = make_config_path(tmp_path, yaml_str, "yaml")
+
+    # libyaml is picked automatically.
+    konfik_c = Konfik(config_path=test_yaml_path)
+    assert konfik_c.backend == "yaml.CSafeLoader"
+
+    monkeypatch.setenv("KONFIK_YAML_LOADER", "pure")
+    konfik_pure = Konfik(config_path=test_yaml_path)
+    assert konfik_pure.backend == "yaml.SafeLoader"
+
+    assert konfik_c._config_raw == konfik_pure._config_raw
+    assert konfik_c.config == konfik_pure.config
+
+    monkeypatch.setenv("KONFIK_YAML_LOADER", "c")
+    assert Konfik(config_path=test_yaml_path).backend == "yaml.CSafeLoader"
+
+    monkeypatch.setenv("KONFIK_YAML_LOADER", "fast")
+    with pytest.raises(ValueError):
+        Konfik(config_path=test_yaml_path)
+
+
+def test_konfik_backends(tmp_path, toml_str, json_str, monkeypatch):
+    """Test the parser backend registry."""
+
+    toml_konfik = Konfik(config_path=make_config_path(tmp_path, toml_str, "toml"))
+    assert toml_konfik.backend in {"tomllib", "tomli", "toml"}
+
+    # Every TOML parser gives the same result.
+    toml = pytest.importorskip("toml")
+    assert toml_konfik._config_raw == toml.loads(toml_str)
+
+    json_path = tmp_path / "config.json"
+    json_path.write_text(json_str)
+    json_konfik = Konfik(config_path=json_path)
+    assert json_konfik.backend in {"orjson", "json"}
+    assert json_konfik.config.clients.data == [["gamma", "delta"], [1, 2]]
+
+    # The stdlib parser takes over documents orjson refuses.
+    nan_path = tmp_path / "nan.json"
+    nan_path.write_text('{"ratio": NaN}')
+    assert Konfik(config_path=nan_path).config.ratio != 0
+
+    # Custom formats can be registered without subclassing Konfik.
+    monkeypatch.setattr(konfik_module, "_backends", dict(konfik_module._backends))
+
+    def load_lines(config_path):
+        with open(config_path) as f:
+            return dict(line.strip().split(":") for line in f if line.strip())
+
+    register_loader(".lines", load_lines)
+    lines_path = tmp_path / "config.lines"
+    lines_path.write_text("title:Lines Example\nowner:Tom\n")
+    konfik = Konfik(config_path=lines_path)
+    assert konfik.backend == "load_lines"
+    assert konfik.config.title == "Lines Example"
+
+    # Built-in formats can be replaced too.
+    register_loader("env", load_lines, name="lines")
+    env_path = tmp_path / "config.env"
+    env_path.write_text("TITLE:Replaced\n")
+    konfik = Konfik(config_path=env_path)
+    assert konfik.backend == "lines"
+    assert konfik.config.TITLE == "Replaced"
+
+    with pytest.raises(NotImplementedError):
+        Konfik(config_path=tmp_path / "config.ini")
+
+
+def test_parse_cache(tmp_path, toml_str, capsys):
+    """Test the on-disk parse cache."""
+
+    test_toml_path = make_config_path(tmp_path, toml_str, "toml")
+    cache = ParseCache(tmp_path / "cache")
+
+    konfik = Konfik(config_path=test_toml_path, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cached = Konfik(config_path=test_toml_path, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached._config_raw == konfik._config_raw
+    assert cached.config.servers.alpha.ip == "10.0.0.1"
+
+    # Changing the file invalidates the entry.
+    test_toml_path.write_text(toml_str.replace("TOML Example", "Changed"))
+    assert Konfik(config_path=test_toml_path, cache=cache).config.title == "Changed"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # An edit that keeps the size and mtime is only caught by the content hash.
+    stat = test_toml_path.stat()
+    test_toml_path.write_text(toml_str.replace("TOML Example", "Chang3d"))
+    os.utime(test_toml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert Konfik(config_path=test_toml_path, cache=cache).config.title == "Changed"
+
+    hashed_cache = ParseCache(tmp_path / "cache", hash_content=True)
+    konfik = Konfik(config_path=test_toml_path, cache=hashed_cache)
+    assert konfik.config.title == "Chang3d"
+    assert (hashed_cache.hits, hashed_cache.misses) == (0, 1)
+    Konfik(config_path=test_toml_path, cache=hashed_cache)
+    assert (hashed_cache.hits, hashed_cache.misses) == (1, 1)
+
+    # A corrupt entry is a miss.
+    for entry in (tmp_path / "cache").iterdir():
+        entry.write_bytes(b"garbage")
+    Konfik(config_path=test_toml_path, cache=hashed_cache)
+    assert (hashed_cache.hits, hashed_cache.misses) == (1, 2)
+
+    hashed_cache.clear()
+    assert list((tmp_path / "cache").iterdir()) == []
+
+    with pytest.raises(MissingConfigError):
+        Konfik(config_path=tmp_path / "missing.toml", cache=cache)
+
+    # The CLI takes a cache directory too.
+    capsys.readouterr()
+    argv = [f"--path={test_toml_path}", "--var=title", f"--cache-dir={tmp_path}"]
+    cli_entrypoint(argv=argv)
+    cli_entrypoint(argv=argv)
+    assert capsys.readouterr().out.count("Chang3d") == 2
+    assert len(list(tmp_path.glob("*.pickle"))) == 1
+
+
+def test_konfik_shared(tmp_path, toml_str, monkeypatch):
+    """Test the process-wide Konfik instances."""
+
+    monkeypatch.setattr(Konfik, "_shared", OrderedDict())
+    test_toml_path = make_config_path(tmp_path, toml_str, "toml")
+
+    konfik = Konfik.shared(test_toml_path)
+    assert Konfik.shared(str(test_toml_path)) is konfik
+
+    # Paths are resolved before they're compared.
+    link_path = tmp_path / "link.toml"
+    link_path.symlink_to(test_toml_path)
+    assert Konfik.shared(link_path) is konfik
+
+    # A different DotMap class gets its own instance.
+    lazy = Konfik.shared(test_toml_path, dotmap_cls=LazyDotMap)
+    assert lazy is not konfik
+    assert isinstance(lazy.config, LazyDotMap) is True
+
+    # The file is parsed again once it changes.
+    test_toml_path.write_text(toml_str.replace("TOML Example", "Changed"))
+    changed = Konfik.shared(test_toml_path)
+    assert changed is not konfik
+    assert changed.config.title == "Changed"
+    assert Konfik.shared(test_toml_path) is changed
+
+    # Explicit invalidation.
+    Konfik.invalidate(link_path)
+    assert Konfik.shared(test_toml_path) is not changed
+    Konfik.invalidate()
+    assert len(Konfik._shared) == 0
+
+    # Least recently used instances are evicted first.
+    monkeypatch.setattr(Konfik, "shared_maxsize", 2)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"config{i}.toml"
+        path.write_text(f"index = {i}")
+        paths.append(path)
+
+    first = Konfik.shared(paths[0])
+    Konfik.shared(paths[1])
+    assert Konfik.shared(paths[0]) is first
+    Konfik.shared(paths[2])
+    assert len(Konfik._shared) == 2
+    assert Konfik.shared(paths[0]) is first
+
+    with pytest.raises(MissingConfigError):
+        Konfik.shared(tmp_path / "missing.toml")
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_konfik_watch(tmp_path, toml_str, use_inotify):
+    """Test reloading the config when the file changes."""
+
+    if use_inotify and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is only available on Linux.")
+
+    test_toml_path = make_config_path(tmp_path, toml_str, "toml")
+    konfik = Konfik(config_path=test_toml_path)
+    old_config = konfik.config
+
+    reloaded, failed = threading.Event(), threading.Event()
+    events = []
+
+    def on_reload(konfik, stats):
+        events.append(("reload", stats))
+        reloaded.set()
+
+    def on_error(konfik, exc, stats):
+        events.append(("error", stats))
+        failed.set()
+
+    reloader = konfik.watch(
+        interval=0.05, on_reload=on_reload, on_error=on_error, use_inotify=use_inotify
+    )
+    try:
+        # Make sure the polling watcher sees a new mtime.
+        time.sleep(0.01)
+        test_toml_path.write_text(toml_str.replace("TOML Example", "Changed"))
+        assert reloaded.wait(5)
+        assert konfik.config.title == "Changed"
+        assert konfik._config_raw["title"] == "Changed"
+
+        # Readers holding the old config aren't affected by the swap.
+        assert old_config.title == "TOML Example"
+
+        _, stats = events[-1]
+        assert stats["reloads"] == 1
+        assert stats["failures"] == 0
+        assert stats["parse_time"] >= 0
+        assert stats["latency"] is not None
+
+        # A broken file keeps the last good config in place.
+        test_toml_path.write_text("title = ")
+        assert failed.wait(5)
+        assert konfik.config.title == "Changed"
+        assert reloader.failures == 1
+    finally:
+        reloader.stop()
+
+    assert reloader.is_alive() is False
+
+
+@pytest.mark.parametrize("config_ext", ["json", "yaml"])
+def test_stream_extract(tmp_path, json_str, yaml_str, config_ext, monkeypatch):
+    """Test that streaming a variable gives the same result as a full load."""
+
+    # Tiny chunks make sure tokens straddle chunk boundaries.
+    monkeypatch.setattr(konfik_stream, "CHUNK_SIZE", 7)
+
+    config_str = json_str if config_ext == "json" else yaml_str
+    test_config_path = make_config_path(tmp_path, config_str, config_ext)
+    konfik = Konfik(config_path=test_config_path)
+
+    queries = [
+        "title",
+        "owner",
+        "owner.dob",
+        "database",
+        "database.ports",
+        "database.ports.2",
+        "database.enabled",
+        "servers.beta",
+        "clients.data.1.0",
+    ]
+    for query in queries:
+        expected = reduce(
+            lambda o, k: o[int(k)] if isinstance(o, list) else o[k],
+            query.split("."),
+            konfik._config_raw,
+        )
+        assert konfik_stream.extract(test_config_path, query) == expected
+
+    for query in ["fakekey", "database.ports.3", "database.ports.x", "title.x"]:
+        with pytest.raises(MissingVariableError):
+            konfik_stream.extract(test_config_path, query)
+
+    with pytest.raises(MissingConfigError):
+        konfik_stream.extract(tmp_path / f"missing.{config_ext}", "title")
+
+
+def test_stream_extract_yaml_aliases(tmp_path):
+    """Test that YAML aliases pointing outside the subtree fall back to a load."""
+
+    yaml_str = """
+base: &base
+  host: localhost
+  port: 5432
+alias: *base
+merged:
+  <<: *base
+  port: 6432
+local:
+  shared: &shared [1, 2]
+  copy: *shared
+"""
+    test_yaml_path = make_config_path(tmp_path, yaml_str, "yaml")
+
+    assert konfik_stream.extract(test_yaml_path, "alias.host") == "localhost"
+    assert konfik_stream.extract(test_yaml_path, "merged.host") == "localhost"
+    assert konfik_stream.extract(test_yaml_path, "merged.port") == 6432
+    assert konfik_stream.extract(test_yaml_path, "local") == {
+        "shared": [1, 2],
+        "copy": [1, 2],
+    }
+
+
+def test_stream_skip_bounded():
+    """Test that skipped values are scanned once and not kept in memory."""
+
+    import io
+    import json
+
+    doc = json.dumps(
+        {
+            "big": list(range(20000)),
+            "long": 'say \\"hi\\" ' * 20000,
+            "target": {"x": 1},
+        }
+    )
+    sizes = []
+
+    class Reader(konfik_stream._JSONReader):
+        def fill(self):
+            filled = super().fill()
+            sizes.append(len(self.buf))
+            return filled
+
+    reader = Reader(io.StringIO(doc), chunk_size=64)
+    reader.find_key("target")
+    assert reader.read_value() == {"x": 1}
+    assert len(sizes) > len(doc) // 64
+    assert max(sizes) < 3 * 64
+
+    # Values spanning many chunks are captured whole.
+    reader = konfik_stream._JSONReader(io.StringIO(doc), chunk_size=64)
+    reader.find_key("big")
+    assert reader.read_value() == list(range(20000))
+    reader.expect(",")
+    assert reader.read_key() == "long"
+
+
+@pytest.mark.parametrize("config_ext", ["json", "yaml"])
+def test_stream_extract_parity(tmp_path, config_ext, monkeypatch):
+    """Test that streaming and a full load agree on repeated keys and indexes."""
+
+    monkeypatch.setattr(konfik_stream, "CHUNK_SIZE", 5)
+    if config_ext == "json":
+        config_str = (
+            '{"a": 1, "a": 2, "b": {"c": [1, 2, 3], "d": 4, "c": [5]},'
+            ' "e": [10, 20, 30], "f": {"g": 1}}'
+        )
+    else:
+        config_str = (
+            "a: 1\na: 2\nb:\n  c: [1, 2, 3]\n  d: 4\n  c: [5]\n"
+            "e: [10, 20, 30]\nf:\n  g: 1\n"
+        )
+    test_config_path = make_config_path(tmp_path, config_str, config_ext)
+    config = Konfik(test_config_path)._config_raw
+
+    for query in ["a", "b", "b.c", "b.c.0", "b.d", "e.-1", "e.1", "f.g", "e.-4"]:
+        try:
+            expected = compile_path(query)(config)
+        except MissingVariableError:
+            with pytest.raises(MissingVariableError):
+                konfik_stream.extract(test_config_path, query)
+        else:
+            assert konfik_stream.extract(test_config_path, query) == expected
+
+
+def test_konfik_cli_stream_var(tmp_path, json_str, capsys, monkeypatch):
+    """Test that the CLI streams --var out of large files."""
+
+    test_json_path = make_config_path(tmp_path, json_str, "json")
+    monkeypatch.setattr(konfik_stream, "STREAM_MIN_SIZE", 0)
+
+    # The file is never loaded in full.
+    def fail(config_path):
+        raise AssertionError("The whole file was loaded.")
+
+    monkeypatch.setattr(Konfik, "_load_json", staticmethod(fail))
+
+    cli_entrypoint(argv=[f"--path={test_json_path}", "--var=servers.alpha.ip"])
+    capture = capsys.readouterr()
+    assert capture.err == ""
+    assert "10.0.0.1" in capture.out
+
+    # Files under the threshold are loaded as before.
+    monkeypatch.setattr(konfik_stream, "STREAM_MIN_SIZE", 1024 * 1024)
+    with pytest.raises(AssertionError):
+        cli_entrypoint(argv=[f"--path={test_json_path}", "--var=title"])
+
+
+def test_konfik_get(tmp_path, toml_str, capsys):
+    """Test dotted path lookups."""
+
+    test_toml_path = make_config_path(tmp_path, toml_str, "toml")
+    konfik = Konfik(config_path=test_toml_path)
+
+    assert konfik.get("title") == "TOML Example"
+    assert konfik.get("servers.alpha.ip") == "10.0.0.1"
+    assert isinstance(konfik.get("servers.alpha"), DotMap) is True
+    assert konfik.get("database.ports.2") == 8002
+    assert konfik.get("clients.data.0.1") == "delta"
+
+    for path in ["fakekey", "database.ports.3", "title.fake", "servers.alpha.ip.0"]:
+        with pytest.raises(MissingVariableError):
+            konfik.get(path)
+    assert konfik.get("database.fake", 42) == 42
+    assert konfik.get("database.fake", None) is None
+
+    # Dots and backslashes inside keys can be escaped.
+    assert split_path("a.b.c") == ["a", "b", "c"]
+    assert split_path(r"a\.b.c") == ["a.b", "c"]
+    assert split_path(r"a\\.b") == ["a\\", "b"]
+    konfik.config["dotted.key"] = {"x": 1}
+    assert konfik.get(r"dotted\.key.x") == 1
+
+    # Compiled paths are cached.
+    compile_path.cache_clear()
+    konfik.get("servers.beta.dc")
+    konfik.get("servers.beta.dc")
+    info = compile_path.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+    # The CLI goes through the same lookup.
+    konfik.show_config_var("database.ports.1")
+    assert "8001" in capsys.readouterr().out
+
+
+def test_konfik_index(tmp_path, toml_str):
+    """Test the flat path index."""
+
+    test_toml_path = make_config_path(tmp_path, toml_str, "toml")
+    konfik = Konfik(config_path=test_toml_path)
+
+    index = konfik.index
+    assert isinstance(index, FlatIndex) is True
+    assert konfik.index is index
+
+    assert index["title"] == "TOML Example"
+    assert index["servers.alpha.ip"] == "10.0.0.1"
+    assert index["database.ports.1"] == 8001
+    assert index["clients.data.0.1"] == "delta"
+    assert isinstance(index["servers.alpha"], DotMap) is True
+    assert "database.enabled" in index
+    assert index.get("database.fake") is None
+    with pytest.raises(MissingVariableError):
+        index["database.fake"]
+
+    # Every path is indexed, not only the leaves.
+    assert len(index) == 27
+    assert len(list(index)) == len(index)
+
+    assert list(index.prefix("database.")) == [
+        ("database.connection_max", 5000),
+        ("database.enabled", True),
+        ("database.ports", [8001, 8001, 8002]),
+        ("database.ports.0", 8001),
+        ("database.ports.1", 8001),
+        ("database.ports.2", 8002),
+        ("database.server", "192.168.1.1"),
+    ]
+    assert list(index.prefix("fake.")) == []
+
+    # Index paths use the same escaping as `split_path`.
+    escaped = FlatIndex({"a.b": {"c": 1}})
+    assert escaped[r"a\.b.c"] == 1
+    assert split_path(r"a\.b.c") == ["a.b", "c"]
+
+    # The index is rebuilt once the config is reloaded.
+    test_toml_path.write_text(toml_str.replace("TOML Example", "Changed"))
+    konfik.reload()
+    assert konfik.index is not index
+    assert konfik.index["title"] == "Changed"
+
+
+def test_konfik_from_layers(tmp_path, toml_str, monkeypatch):
+    """Test merging several config sources."""
+
+    base_path = make_config_path(tmp_path, toml_str, "toml")
+    prod_path = tmp_path / "prod.yaml"
+    prod_path.write_text("database:\n  server: 10.0.0.5\n  ports: [9000]\n")
+    env_path = tmp_path / "config.env"
+    env_path.write_text("title=Env Example\n")
+    overrides = {"servers": {"beta": {"ip": "10.0.0.9"}}}
+
+    konfik = Konfik.from_layers([base_path, prod_path, env_path, overrides])
+    config = konfik.config
+
+    assert isinstance(config, DotMap) is True
+    assert config.title == "Env Example"
+    assert config.database.server == "10.0.0.5"
+    assert config.database.ports == [9000]
+    assert config.database.connection_max == 5000
+    assert config.servers.beta == {"ip": "10.0.0.9", "dc": "eqdc10"}
+    assert config.servers.alpha.ip == "10.0.0.1"
+
+    # Subtrees nobody overrides are shared with the layer they came from.
+    base_raw = konfik._layers[0].config
+    assert konfik._config_raw["owner"] is base_raw["owner"]
+    assert konfik._config_raw["servers"]["alpha"] is base_raw["servers"]["alpha"]
+    assert konfik._config_raw["database"] is not base_raw["database"]
+    assert base_raw["database"]["server"] == "192.168.1.1"
+
+    assert konfik.origin("title") == str(env_path)
+    assert konfik.origin("database") == str(prod_path)
+    assert konfik.origin("database.server") == str(prod_path)
+    assert konfik.origin("database.enabled") == str(base_path)
+    assert konfik.origin("owner.name") == str(base_path)
+    assert konfik.origin("servers.beta.ip") == "<mapping 3>"
+    assert konfik.origin("servers.beta.dc") == str(base_path)
+    with pytest.raises(MissingVariableError):
+        konfik.origin("fakekey")
+
+    # Only the changed layer is read again.
+    merged = list(konfik._merged)
+    prod_path.write_text("database:\n  server: 10.0.0.6\n")
+    konfik.reload()
+    assert konfik.config.database.server == "10.0.0.6"
+    assert konfik.config.database.ports == [8001, 8001, 8002]
+    assert konfik._merged[0] is merged[0]
+    assert konfik._merged[1] is not merged[1]
+
+    overrides["title"] = "Mapping Example"
+    konfik.reload()
+    assert konfik.config.title == "Mapping Example"
+    assert konfik._merged[2] is not merged[2]
+
+    # Nothing changed, nothing is swapped.
+    config = konfik.config
+    konfik.reload()
+    assert konfik.config is config
+
+    monkeypatch.setenv("KONFIK_TEST_LAYER", "1")
+    konfik = Konfik.from_layers([base_path, os.environ])
+    assert konfik.config.KONFIK_TEST_LAYER == "1"
+    assert konfik.origin("KONFIK_TEST_LAYER") == "<environ>"
+
+
+def test_konfik_aload(tmp_path, toml_str, json_str, yaml_str):
+    """Test loading configs from asyncio code."""
+
+    import asyncio
+
+    paths = []
+    for i in range(6):
+        config_str, config_ext = [
+            (toml_str, "toml"),
+            (json_str, "json"),
+            (yaml_str, "yaml"),
+        ][i % 3]
+        path = tmp_path / f"config{i}.{config_ext}"
+        path.write_text(config_str)
+        paths.append(path)
+
+    class TrackingKonfik(Konfik):
+        """Konfik that records how many instances are loading at once."""
+
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def __init__(self, *args, **kwargs):
+            cls = type(self)
+            with cls.lock:
+                cls.running += 1
+                cls.peak = max(cls.peak, cls.running)
+            time.sleep(0.02)
+            try:
+                super().__init__(*args, **kwargs)
+            finally:
+                with cls.lock:
+                    cls.running -= 1
+
+    async def main():
+        konfik = await Konfik.aload(paths[0], dotmap_cls=LazyDotMap)
+        konfiks = await TrackingKonfik.aload_many(paths, limit=2)
+        return konfik, konfiks
+
+    loop = asyncio.new_event_loop()
+    try:
+        konfik, konfiks = loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+    assert isinstance(konfik, Konfik) is True
+    assert isinstance(konfik.config, LazyDotMap) is True
+    assert konfik.config.title == "TOML Example"
+
+    # The results match the synchronous path and keep the order of the paths.
+    assert [k._config_path for k in konfiks] == paths
+    for path, k in zip(paths, konfiks):
+        assert k._config_raw == Konfik(path)._config_raw
+    assert TrackingKonfik.peak <= 2
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_konfik_from_directory(tmp_path, toml_str, yaml_str, monkeypatch, workers):
+    """Test loading a conf.d directory."""
+
+    conf_d = tmp_path / "conf.d"
+    conf_d.mkdir()
+    (conf_d / "10-base.yaml").write_text(yaml_str)
+    (conf_d / "20-db.yaml").write_text("database:\n  server: 10.0.0.5\n")
+    (conf_d / "30-broken.yaml").write_text("database: [")
+    (conf_d / "40-app.toml").write_text(toml_str)
+    (conf_d / "README.md").write_text("Not a config file.")
+
+    # Pure-Python parsing goes to a process pool.
+    monkeypatch.setenv("KONFIK_YAML_LOADER", "pure")
+
+    konfik = Konfik.from_directory(conf_d, pattern="*.yaml", workers=workers)
+    assert list(konfik.config) == ["10-base", "20-db"]
+    assert konfik.config["10-base"].title == "YAML Example"
+    assert konfik.config["20-db"].database.server == "10.0.0.5"
+
+    assert [os.path.basename(r["path"]) for r in konfik.report] == [
+        "10-base.yaml",
+        "20-db.yaml",
+        "30-broken.yaml",
+    ]
+    assert [r["backend"] for r in konfik.report[:2]] == ["yaml.SafeLoader"] * 2
+    assert all(r["seconds"] >= 0 for r in konfik.report)
+    assert konfik.report[0]["error"] is None
+    assert isinstance(konfik.report[2]["error"], Exception) is True
+
+    # Merged in filename order.
+    monkeypatch.delenv("KONFIK_YAML_LOADER")
+    konfik = Konfik.from_directory(conf_d, workers=workers, merge=True)
+    assert konfik.config.title == "TOML Example"
+    assert konfik.config.database.server == "192.168.1.1"
+    assert konfik.config.database.connection_max == 5000
+    assert len(konfik.report) == 4
+
+    # Reloading scans the directory again.
+    (conf_d / "30-broken.yaml").write_text("database:\n  server: 10.0.0.6\n")
+    konfik.reload()
+    assert konfik.config.database.server == "192.168.1.1"
+    assert konfik.report[2]["error"] is None
+    (conf_d / "50-override.json").write_text('{"title": "Override"}')
+    konfik.reload()
+    assert konfik.config.title == "Override"
+    assert konfik.changes == ["title"]
+    with pytest.raises(NotImplementedError):
+        konfik.watch()
+
+    # Files that would share a key are reported instead of overriding it.
+    (conf_d / "20-db.json").write_text('{"database": {"server": "10.0.0.7"}}')
+    konfik = Konfik.from_directory(conf_d, workers=workers)
+    assert konfik.config["20-db"].database.server == "10.0.0.7"
+    assert os.path.basename(konfik.report[1]["path"]) == "20-db.json"
+    assert konfik.report[2]["error"].args == (
+        "'20-db' is already loaded from another file",
+    )
+
+
+def test_konfik_stats(tmp_path, json_str, capsys, monkeypatch):
+    """Test the load stats, the stats hooks and the --stats flag."""
+
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json_str)
+
+    reported = []
+    monkeypatch.setattr(konfik_module, "_stats_hooks", [])
+    register_stats_hook(lambda konfik, stats: reported.append((konfik, stats)))
+
+    konfik = Konfik(config_path)
+    stats = konfik.stats
+    for phase in ("io", "parse", "convert"):
+        assert stats[phase] >= 0
+    assert stats["render"] == stats["diff"] == 0
+    assert stats["bytes_read"] == len(json_str.encode())
+    assert stats["nodes"] > len(konfik.config)
+    # clients.data holds nested lists.
+    assert stats["max_depth"] == 4
+    assert stats["memory"] > 0
+    assert reported == [(konfik, stats)]
+
+    config_path.write_text('{"a": {"b": [1, 2]}}')
+    konfik.reload()
+    assert konfik.stats["nodes"] == 5
+    assert konfik.stats["max_depth"] == 3
+    assert konfik.stats["bytes_read"] == 20
+    assert konfik.stats["diff"] > 0
+    assert len(reported) == 2
+
+    konfik.show_config()
+    assert konfik.stats["render"] > 0
+
+    capsys.readouterr()
+    cli_entrypoint(argv=[f"--path={config_path}", "--var=a.b", "--stats"])
+    capture = capsys.readouterr()
+    assert "Konfik -- The strangely familiar config parser" in capture.out
+    assert "parse" in capture.err
+    assert "bytes_read         20" in capture.err
+
+
+def test_konfik_typed(tmp_path, toml_str, capsys):
+    """Test the typed config classes."""
+
+    from konfik.typed import SlotConfig, derive, from_schema, generate_source
+
+    config_path = make_config_path(tmp_path, toml_str, "toml")
+    Config = derive(Konfik(config_path).config)
+    konfik = Konfik(config_path, dotmap_cls=Config)
+
+    assert isinstance(konfik.config, SlotConfig) is True
+    assert konfik.config.database.ports == [8001, 8001, 8002]
+    assert konfik.config.servers.beta.ip == "10.0.0.2"
+    assert konfik.get("servers.alpha.dc") == "eqdc10"
+    assert not hasattr(konfik.config.database, "__dict__")
+    with pytest.raises(AttributeError):
+        konfik.config.title = "Changed"
+
+    # The shape is checked on load.
+    with pytest.raises(UnknownVariableError, match="database.extra"):
+        Config({**konfik._config_raw, "database": {"extra": 1}})
+    raw = dict(konfik._config_raw, owner={"name": "Tom"})
+    with pytest.raises(MissingVariableError, match="owner.dob"):
+        Config(raw)
+
+    # Lists of mappings share a class, keys missing from some items are optional.
+    Pool = derive({"hosts": [{"name": "a", "port": 1}, {"name": "b"}]}, name="Pool")
+    pool = Pool({"hosts": [{"name": "c"}, {"name": "d", "port": 2}]})
+    assert [host.port for host in pool.hosts] == [None, 2]
+    for dotmap_cls in (DotMap, LazyDotMap):
+        pool = Pool(dotmap_cls({"hosts": [{"name": "c"}]}))
+        assert pool.hosts[0].port is None
+
+    # Keys that aren't identifiers get attribute names but keep their keys.
+    Odd = derive({"class": 1, "max-size": 2})
+    odd = Odd({"class": 3, "max-size": 4})
+    assert (odd.class_, odd.max_size, odd["max-size"]) == (3, 4, 4)
+
+    # Keys named like class members don't shadow them.
+    Cart = derive({"cart": {"items": [1], "keys": 2, "get": 3, "_fields": 4}})
+    cart = Cart({"cart": {"items": [5], "keys": 6, "get": 7, "_fields": 8}}).cart
+    assert dict(cart) == {"items": [5], "keys": 6, "get": 7, "_fields": 8}
+    assert (cart.items_, cart.keys_, cart.get_, cart._fields_) == ([5], 6, 7, 8)
+    assert cart.get("keys") == 6
+    namespace = {}
+    exec(generate_source(Cart), namespace)
+    assert dict(namespace["Config"]({"cart": dict(cart)}).cart) == dict(cart)
+
+    Schema = from_schema(
+        {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "db": {
+                    "type": "object",
+                    "properties": {"host": {"type": "string"}},
+                },
+            },
+            "required": ["db"],
+        }
+    )
+    assert Schema({"db": {"host": "h"}}).name is None
+    with pytest.raises(MissingVariableError):
+        Schema({})
+
+    # The generated module defines the same classes.
+    namespace = {}
+    exec(generate_source(Config), namespace)
+    assert namespace["Config"](konfik._config_raw) == konfik.config
+
+    cli_entrypoint(argv=[f"--path={config_path}", "--gen-classes"])
+    capture = capsys.readouterr()
+    assert "class Database(SlotConfig):" in capture.out
+    assert capture.err == ""
+
+
+def test_frozen_dotmap(tmp_path, toml_str):
+    """Test the FrozenDotMap class."""
+
+    config_path = make_config_path(tmp_path, toml_str, "toml")
+    konfik = Konfik(config_path, dotmap_cls=FrozenDotMap)
+    config = konfik.config
+
+    assert isinstance(config.servers.alpha, FrozenDotMap) is True
+    assert config.database.ports == (8001, 8001, 8002)
+    assert config.clients.data == (("gamma", "delta"), (1, 2))
+    assert konfik.get("database.ports.1") == 8001
+
+    for mutate in (
+        lambda: setattr(config, "title", "Changed"),
+        lambda: config.__setitem__("title", "Changed"),
+        lambda: config.__delitem__("title"),
+        lambda: config.update(title="Changed"),
+        lambda: config.pop("title"),
+        lambda: config.clear(),
+    ):
+        with pytest.raises(TypeError):
+            mutate()
+    assert config.title == "TOML Example"
+
+    # Keys are interned, so separately loaded configs share them.
+    other = Konfik(config_path, dotmap_cls=FrozenDotMap).config
+    key = next(iter(config.database))
+    assert next(iter(other.database)) is key
+
+    # Equal configs hash alike and can be cache keys.
+    assert other == config and hash(other) == hash(config)
+    assert repr(config) is repr(config)
+    assert FrozenDotMap(config_dict={"a": 1}) != FrozenDotMap(config_dict={"a": 2})
+
+    calls = []
+
+    @lru_cache(maxsize=None)
+    def count_servers(cfg):
+        calls.append(cfg)
+        return len(cfg.servers)
+
+    assert count_servers(config) == count_servers(other) == 2
+    assert len(calls) == 1
+
+    assert pickle.loads(pickle.dumps(config)) == config
+    assert copy.deepcopy(config) is config
+
+
+@pytest.mark.parametrize("interpolate", [True, "lazy"])
+def test_konfik_interpolate(tmp_path, monkeypatch, capsys, interpolate):
+    """Test resolving ${...} references."""
+
+    from konfik.interpolate import Resolver
+
+    monkeypatch.setenv("KONFIK_TEST_HOME", "/home/konfik")
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(
+        "database:\n"
+        "  host: db.local\n"
+        "  port: 5432\n"
+        '  url: "postgres://${database.host}:${database.port}/app"\n'
+        "home: ${ENV:KONFIK_TEST_HOME}\n"
+        "port: ${database.port}\n"
+        "primary: ${database}\n"
+        "hosts: ['${database.host}', other.local]\n"
+        'literal: "$${database.host}"\n'
+    )
+
+    konfik = Konfik(config_path, interpolate=interpolate)
+    config = konfik.config
+    assert config.database.url == "postgres://db.local:5432/app"
+    assert config.home == "/home/konfik"
+    assert config.port == 5432
+    assert config.primary.host == "db.local"
+    assert config.hosts == ["db.local", "other.local"]
+    assert config.literal == "${database.host}"
+
+    assert pickle.loads(pickle.dumps(config)).database.url == config.database.url
+
+    # Printed values are resolved too.
+    konfik.show_config_var("database.url")
+    assert "'postgres://db.local:5432/app'" in capsys.readouterr().out
+    konfik.show_config_var("hosts.0")
+    assert capsys.readouterr().out == "'db.local'\n"
+    konfik.show_config()
+    out = capsys.readouterr().out
+    assert "'home': '/home/konfik'" in out and "${ENV" not in out
+
+    # Cycles are reported with the chain of references.
+    config_path.write_text("a: ${b}\nb: {c: '${a}'}\nd: 1\n")
+    if interpolate is True:
+        with pytest.raises(InterpolationError, match=r"a -> b -> b\.c -> a"):
+            konfik.reload()
+    else:
+        konfik.reload()
+        assert konfik.config.d == 1
+        with pytest.raises(InterpolationError, match="Circular reference"):
+            konfik.config.a
+
+    with pytest.raises(MissingVariableError):
+        Resolver({"a": "${nope}"}).resolve({"a": "${nope}"})
+
+    # Every referenced node is resolved once and unchanged subtrees are shared.
+    config_raw = {"base": {"x": 1}, "refs": ["${base}"] * 3, "other": {"y": 2}}
+    resolver = Resolver(config_raw)
+    resolved = resolver.resolve(config_raw)
+    assert resolved["refs"][0] is resolved["refs"][2] is config_raw["base"]
+    assert resolved["other"] is config_raw["other"]
+
+
+def test_binary_format():
+    """Test encoding configs to the binary format and reading them in place."""
+
+    import datetime as dt
+
+    from konfik import binary
+
+    config_raw = {
+        "name": "konfik",
+        "ratio": 0.5,
+        "big": 1 << 70,
+        "flags": [True, False, None],
+        "nested": {"name": "inner", "ports": (1, 2, 3), 1: "int key"},
+        "empty": {},
+        "dob": dt.datetime(
+            1979, 5, 27, 7, 32, tzinfo=dt.timezone(-dt.timedelta(hours=8))
+        ),
+        "day": dt.date(1979, 5, 27),
+        "at": dt.time(7, 32, 0, 999999),
+        "tags": {"a", "b"},
+    }
+    config = binary.load(binary.dumps(config_raw))
+
+    # Nothing is decoded before it's accessed.
+    assert config.nested._table is None
+    assert config.nested.ports[-1] == 3
+    assert config.nested[1] == "int key"
+    assert config["flags"][:2] == [True, False]
+    assert config.big == 1 << 70
+    assert binary.materialize(config) == dict(
+        config_raw, nested={"name": "inner", "ports": [1, 2, 3], 1: "int key"}
+    )
+    assert "missing" not in config and config.get("missing") is None
+    with pytest.raises(MissingVariableError):
+        config.missing
+    with pytest.raises(TypeError):
+        config.name = "changed"
+
+    assert config.dob.utcoffset() == -dt.timedelta(hours=8)
+    assert config.tags == frozenset(["a", "b"])
+
+    # Only known types are encoded, nothing is pickled.
+    with pytest.raises(TypeError, match="'object'"):
+        binary.dumps({"value": object()})
+
+    with pytest.raises(ValueError, match="Not a konfik binary config"):
+        binary.load(b"not binary at all, really")
+    data = bytearray(binary.dumps(config_raw))
+    data[4] = binary.VERSION + 1
+    with pytest.raises(ValueError, match="version"):
+        binary.load(data)
+
+
+@pytest.mark.parametrize("to_file", [False, True])
+def test_konfik_publish(tmp_path, toml_str, to_file):
+    """Test sharing a config between processes."""
+
+    config_path = make_config_path(tmp_path, toml_str, "toml")
+    konfik = Konfik(config_path)
+    path = str(tmp_path / "config.kfb") if to_file else None
+    publication = konfik.publish(path=path)
+
+    try:
+        attached = Konfik.attach(publication.name, path=path)
+        assert attached.config == konfik._config_raw
+        assert attached.config.servers.alpha.ip == "10.0.0.1"
+        assert attached.get("database.ports.2") == 8002
+        with pytest.raises(NotImplementedError):
+            attached.reload()
+
+        # Another process reads the same memory.
+        code = (
+            "import sys; from konfik import Konfik; "
+            "konfik = Konfik.attach(sys.argv[1], path=sys.argv[2] or None); "
+            "print(konfik.config.database.server)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code, publication.name or "", path or ""],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "192.168.1.1"
+    finally:
+        publication.close()
+        publication.unlink()
+
+
+def test_konfik_compile(tmp_path, yaml_str, capsys):
+    """Test compiling configs into .kfc snapshots and loading them."""
+
+    from konfik.compiled import compile_config
+
+    config_path = make_config_path(tmp_path, yaml_str, "yaml")
+    cli_entrypoint(argv=["compile", str(config_path)])
+    compiled_path = config_path.with_suffix(".kfc")
+    assert str(compiled_path) in capsys.readouterr().out
+
+    konfik = Konfik(compiled_path)
+    assert konfik.backend == "kfc"
+    assert konfik.config.servers.alpha.ip == "10.0.0.1"
+    assert konfik.get("database.ports.2") == 8002
+    assert konfik.config.clients.data[0] == ["gamma", "delta"]
+    assert konfik.config.servers == Konfik(config_path).config.servers
+
+    cli_entrypoint(argv=[f"--path={compiled_path}", "--var=database.server"])
+    assert "192.168.1.1" in capsys.readouterr().out
+    cli_entrypoint(
+        argv=[f"--path={compiled_path}", "--export=env", "--var=database.ports"]
+    )
+    assert capsys.readouterr().out.splitlines() == [
+        "DATABASE__PORTS__0='8001'",
+        "DATABASE__PORTS__1='8001'",
+        "DATABASE__PORTS__2='8002'",
+    ]
+
+    # Changing the source makes the snapshot stale.
+    time.sleep(0.01)
+    config_path.write_text(yaml_str.replace("10.0.0.1", "10.0.0.9"))
+    with pytest.raises(StaleConfigError):
+        Konfik(compiled_path)
+    output = tmp_path / "app.kfc"
+    assert compile_config(config_path, output) == str(output)
+    assert Konfik(output).config.servers.alpha.ip == "10.0.0.9"
+
+    # Compiled configs skip the parse cache.
+    cache = ParseCache(tmp_path / "cache")
+    assert Konfik(output, cache=cache).config.servers.alpha.ip == "10.0.0.9"
+    assert cache.misses == 0
+    cli_entrypoint(
+        argv=[f"--path={output}", f"--cache-dir={tmp_path}", "--var=database.server"]
+    )
+    assert "192.168.1.1" in capsys.readouterr().out
+
+    # Unpicklable configs aren't cached, and nothing is left behind.
+    cache.load(config_path, "yaml", lambda path: {"view": memoryview(b"")})
+    assert os.listdir(tmp_path / "cache") == []
+
+    # A snapshot without its source is trusted.
+    config_path.unlink()
+    assert Konfik(output).config.servers.alpha.ip == "10.0.0.9"
+
+    data = bytearray(output.read_bytes())
+    data[-1] ^= 0xFF
+    output.write_bytes(data)
+    with pytest.raises(ValueError, match="checksum"):
+        Konfik(output)
+
+    data[4] += 1
+    output.write_bytes(data)
+    with pytest.raises(ValueError, match="incompatible"):
+        Konfik(output)
+
+    with pytest.raises(MissingConfigError):
+        Konfik(tmp_path / "missing.kfc")
+
+
+def test_konfik_compiled_views(tmp_path, json_str):
+    """Test that indexing, stats and interpolation walk binary views."""
+
+    from konfik.compiled import compile_config
+
+    config_path = make_config_path(tmp_path, json_str, "json")
+    compiled_path = compile_config(config_path)
+    konfik, compiled = Konfik(config_path), Konfik(compiled_path)
+
+    assert len(compiled.index) == len(konfik.index)
+    assert compiled.index["clients.data.1.0"] == 1
+    for key in ["nodes", "max_depth"]:
+        assert compiled.stats[key] == konfik.stats[key]
+
+    config_path.write_text('{"h": "x", "u": "${h}", "l": ["${h}", 1]}')
+    compiled_path = compile_config(config_path)
+    konfik = Konfik(compiled_path, interpolate=True)
+    assert konfik.get("u") == "x"
+    assert konfik.get("l") == ["x", 1]
+
+
+def test_konfik_daemon(tmp_path, toml_str, capsys, monkeypatch):
+    """Test answering CLI queries from `konfik serve`."""
+
+    from konfik import daemon
+
+    config_path = make_config_path(tmp_path, toml_str, "toml")
+    socket_path = str(tmp_path / "konfik.sock")
+    monkeypatch.setenv("KONFIK_SOCKET", socket_path)
+
+    # Without a daemon, the CLI handles queries itself.
+    assert daemon.query({"path": str(config_path)}) is None
+    cli_entrypoint(argv=[f"--path={config_path}", "--var=servers.alpha.ip"])
+    assert "10.0.0.1" in capsys.readouterr().out
+
+    # Files that aren't sockets are left alone.
+    not_socket = tmp_path / "not.sock"
+    not_socket.write_text("")
+    with pytest.raises(OSError, match="isn't a socket"):
+        daemon.make_server(str(not_socket))
+    assert not_socket.exists()
+
+    answered = []
+
+    def answer(request):
+        answered.append(request)
+        return daemon_answer(request)
+
+    daemon_answer = daemon.answer
+    monkeypatch.setattr(daemon, "answer", answer)
+
+    server = daemon.make_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(OSError, match="already listening"):
+            daemon.make_server()
+        answered.clear()
+
+        # Sockets that another user could have created are never queried.
+        os.chmod(socket_path, 0o666)
+        assert daemon.query({"path": str(config_path)}) is None
+        os.chmod(socket_path, 0o600)
+        uid = os.getuid()
+        monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+        assert daemon.query({"path": str(config_path)}) is None
+        monkeypatch.setattr(os, "getuid", lambda: uid)
+        assert daemon.query({"path": str(config_path)})["text"]
+        assert not answered[-1].get("var")
+        answered.clear()
+
+        cli_entrypoint(argv=[f"--path={config_path}", "--var=servers.alpha.ip"])
+        assert "10.0.0.1" in capsys.readouterr().out
+        assert answered[-1]["var"] == "servers.alpha.ip"
+
+        # The file is parsed again after it changes.
+        time.sleep(0.01)
+        config_path.write_text(toml_str.replace("10.0.0.1", "10.0.0.9"))
+        cli_entrypoint(argv=[f"--path={config_path}", "--var=servers.alpha.ip"])
+        assert "10.0.0.9" in capsys.readouterr().out
+        assert len(answered) == 2
+
+        cli_entrypoint(argv=[f"--path={config_path}", "--show"])
+        assert "TOML Example" in capsys.readouterr().out
+        assert "var" not in answered[-1]
+
+        # Errors are reported by the CLI itself.
+        with pytest.raises(MissingVariableError):
+            cli_entrypoint(argv=[f"--path={config_path}", "--var=servers.gamma"])
+        assert "error" in daemon.query({"path": str(config_path), "var": "nope"})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_konfik_cli_export(tmp_path, toml_str, capsys):
+    """Test exporting many variables in one CLI call."""
+
+    import json
+
+    from dotenv import dotenv_values
+
+    config_path = make_config_path(tmp_path, 'quote = "it\'s"\n' + toml_str, "toml")
+
+    # Several variables at once.
+    cli_entrypoint(
+        argv=[f"--path={config_path}", "--var=servers.alpha.ip", "--var=database"]
+    )
+    out = capsys.readouterr().out
+    assert out.index("10.0.0.1") < out.index("192.168.1.1")
+
+    cli_entrypoint(argv=[f"--path={config_path}", "--export=shell"])
+    out = capsys.readouterr().out
+    assert "Konfik" not in out
+    assert "export DATABASE__PORTS__2='8002'" in out
+    script = out + 'printf "%s|%s" "$SERVERS__BETA__IP" "$QUOTE"'
+    result = subprocess.run(
+        ["sh", "-c", script], stdout=subprocess.PIPE, universal_newlines=True
+    )
+    assert result.stdout == "10.0.0.2|it's"
+
+    cli_entrypoint(argv=[f"--path={config_path}", "--export=env", "--var=database"])
+    env_path = tmp_path / "exported.env"
+    env_path.write_text(capsys.readouterr().out)
+    assert dotenv_values(env_path) == {
+        "DATABASE__SERVER": "192.168.1.1",
+        "DATABASE__PORTS__0": "8001",
+        "DATABASE__PORTS__1": "8001",
+        "DATABASE__PORTS__2": "8002",
+        "DATABASE__CONNECTION_MAX": "5000",
+        "DATABASE__ENABLED": "true",
+    }
+
+    cli_entrypoint(
+        argv=[
+            f"--path={config_path}",
+            "--export=ndjson",
+            "--var=owner",
+            "--var=clients",
+        ]
+    )
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines[0] == {"key": "owner.name", "value": "Tom Preston-Werner"}
+    assert lines[1]["value"].startswith("1979-05-27T07:32:00")
+    assert lines[-1] == {"key": "clients.data.1.1", "value": 2}
+
+
+def test_konfik_diff(tmp_path, json_str, capsys):
+    """Test change detection with subtree hashes."""
+
+    import json
+
+    from konfik.merkle import diff, hash_tree, reuse
+
+    old = json.loads(json_str)
+    new = json.loads(json_str)
+    assert diff(old, new) == []
+
+    new["database"]["ports"].append(8003)
+    new["servers"]["alpha"]["ip"] = "10.0.0.9"
+    new["servers"]["gamma.local"] = {"ip": "10.0.0.3"}
+    del new["owner"]
+    assert diff(old, new) == [
+        "database.ports.3",
+        "servers.alpha.ip",
+        "servers.gamma\\.local",
+        "owner",
+    ]
+
+    # Key order doesn't count, types do.
+    reordered = dict(reversed(list(old.items())))
+    assert hash_tree(reordered).digest == hash_tree(old).digest
+    assert diff({"a": 1}, {"a": 1.0}) == ["a"]
+    assert diff({"a": [1]}, {"a": {"0": 1}}) == ["a"]
+
+    merged = reuse(old, new, hash_tree(old), hash_tree(new))
+    assert merged == new
+    assert merged["clients"] is old["clients"]
+    assert merged["servers"]["beta"] is old["servers"]["beta"]
+    assert merged["servers"] is not old["servers"]
+
+    # Reloads record what changed.
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json_str)
+    konfik = Konfik(config_path)
+    assert konfik.changes is None
+    clients, beta = konfik.config.clients, konfik.config.servers.beta
+    config_path.write_text(json_str.replace("10.0.0.1", "10.0.0.9"))
+    konfik.reload()
+    assert konfik.changes == ["servers.alpha.ip"]
+    assert konfik.config.clients is clients
+    assert konfik.config.servers.beta is beta
+    assert konfik.config.servers.alpha.ip == "10.0.0.9"
+    konfik.reload()
+    assert konfik.changes == []
+
+    # Lazy and frozen configs keep their unchanged subtrees too.
+    for dotmap_cls in (LazyDotMap, FrozenDotMap):
+        konfik = Konfik(config_path, dotmap_cls=dotmap_cls)
+        database, beta = konfik.config.database, konfik.config.servers.beta
+        config_path.write_text(json_str)
+        konfik.reload()
+        assert type(konfik.config) is dotmap_cls
+        assert konfik.config.database is database
+        assert konfik.config.servers.beta is beta
+        assert konfik.config.servers.alpha.ip == "10.0.0.1"
+        config_path.write_text(json_str.replace("10.0.0.1", "10.0.0.9"))
+
+    new_path = tmp_path / "new.json"
+    new_path.write_text(config_path.read_text().replace("5000", "6000"))
+    assert cli_entrypoint(argv=["diff", str(config_path), str(new_path)]) == 1
+    assert capsys.readouterr().out == "database.connection_max\n"
+    assert cli_entrypoint(argv=["diff", str(config_path), str(config_path)]) == 0
+    assert capsys.readouterr().out == ""